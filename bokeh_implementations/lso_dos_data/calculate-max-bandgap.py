@@ -1,12 +1,13 @@
-import pandas as pd
 import os
+import sys
+from pathlib import Path
 
-csv_file = os.path.join("datasets", "data_luc", "CombinedHDPinfo_lsodos.csv")
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from lsodos.metadata import band_edges
 
-df = pd.read_csv(csv_file)
+csv_file = os.path.join("datasets", "data_luc", "CombinedHDPinfo_lsodos.csv")
 
-max_conduction_band_minimum = df["CBM"].max()
-max_valence_band_maximum = df["VBM"].max()
+max_conduction_band_minimum, max_valence_band_maximum = band_edges(csv_file)
 
 print(f"Maximum conduction band minimum (CBM) across all materials: {max_conduction_band_minimum:.5f} eV")
 print(f"Maximum valence band maximum (VBM) across all materials: {max_valence_band_maximum:.5f} eV")
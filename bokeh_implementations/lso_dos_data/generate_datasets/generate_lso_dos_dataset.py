@@ -1,28 +1,14 @@
-import json
-import numpy as np
-import pandas as pd
 from pathlib import Path
 import os
+import sys
 
-folder = Path(os.path.join("datasets", "LSODOS"))
-records = []
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.longformat import LONG_DATASET, LongDataset, write_long_dataset
 
-for file in folder.glob("*.json"):
-    with open(file, "r") as f:
-        data = json.load(f)
+folder = os.path.join("datasets", "LSODOS")
 
-    energies = np.array(data["tdos"]["energies"], dtype=float)
-    dens_up = np.array(data["tdos"]["densities"]["1"], dtype=float)
-    dens_dn = np.array(data["tdos"]["densities"]["-1"], dtype=float)
-    dos = dens_up + dens_dn
+materials = write_long_dataset(folder, LONG_DATASET)
 
-    for energy, dos in zip(energies, dos):
-        records.append({"material": file.stem, "energy": energy, "tdos": dos})
-
-df = pd.DataFrame(records)
-
-output_dir = os.path.join("datasets", "output")
-os.makedirs(output_dir, exist_ok=True)
-df.to_csv(os.path.join(output_dir, "dos_dataset_long.csv"), index=False)
-
-print(df.head())
+print(f"Saved {len(materials)} materials to {LONG_DATASET}")
+if materials:
+    print(LongDataset(LONG_DATASET).read(materials[0]).head())
@@ -1,26 +1,28 @@
-import json
 import numpy as np
-import pandas as pd
-from scipy.interpolate import interp1d
 from pathlib import Path
 import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.datasets import CsvDatasetWriter, energy_columns
+from lsodos.ingest import iter_corpus
+from lsodos.resample import resample
 
 folder = os.path.join("datasets", "LSODOS")
 
 dE = 0.01   
-rows = []
 
-file_list = [f for f in os.listdir(folder) if f.endswith(".json")]
+output_dir = os.path.join("datasets", "output")
+out_file = os.path.join(output_dir, "dos_dataset_interpolated_5ev_around_fermi.csv")
 
-for fname in file_list:
-    fpath = os.path.join(folder, fname)
-    with open(fpath, "r") as f:
-        data = json.load(f)
+# the header is taken from the last material's grid, so it is only known at the end
+writer = CsvDatasetWriter(out_file, None)
 
-    energies = np.array(data["tdos"]["energies"], dtype=float)
-    efermi = float(data["tdos"]["efermi"])
-    dens_up = np.array(data["tdos"]["densities"]["1"], dtype=float)
-    dens_dn = np.array(data["tdos"]["densities"]["-1"], dtype=float)
+for record in iter_corpus(folder):
+    energies = record["tdos"]["energies"]
+    efermi = record["tdos"]["efermi"]
+    dens_up = record["tdos"]["densities"]["1"]
+    dens_dn = record["tdos"]["densities"]["-1"]
     dos = dens_up + dens_dn
 
 
@@ -29,25 +31,13 @@ for fname in file_list:
     emax = efermi + 5.0
     energy_grid = np.arange(emin, emax + dE, dE)
 
-    interp = interp1d(  
-        energies, dos,
-        bounds_error=False, 
-        fill_value=0.0,
-        kind="nearest"
-    )
-    dos_resampled = interp(energy_grid)
+    dos_resampled = resample(energies, dos, energy_grid, kind="nearest")
 
-    material_name = Path(fname).stem
-    rows.append([material_name, *dos_resampled])
+    material_name = record["material"]
+    writer.append(material_name, dos_resampled.tolist())
     print(f"Processed {material_name}, range: {emin:.2f} → {emax:.2f} eV, shape: {dos_resampled.shape}")
 
-colnames = ["material"] + [f"E={e:.3f}eV" for e in energy_grid]
-df = pd.DataFrame(rows, columns=colnames)
-
-output_dir = os.path.join("datasets", "output")
-os.makedirs(output_dir, exist_ok=True)
-out_file = os.path.join(output_dir, "dos_dataset_interpolated_5ev_around_fermi.csv")
-df.to_csv(out_file, index=False)
+writer.close(energy_columns(energy_grid))
 
-print("Final shape:", df.shape)
+print("Final shape:", (writer.n_rows, len(writer.columns)))
 print("Saved to:", out_file)
@@ -1,56 +1,74 @@
 import os
+import json
 import random
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
+from pathlib import Path
+import sys
 
-OUTPUT_DIR = os.path.join("datasets", "output")
-RAW_DIR = os.path.join(OUTPUT_DIR, "raw_per_channel")
-HIST_DIR = os.path.join(OUTPUT_DIR, "one_site_histograms")
-PLOT_DIR = os.path.join(OUTPUT_DIR, "plots", "comparison_persite_hist")
+sys.path.insert(0, str(Path(__file__).resolve().parents[6]))
+from lsodos.datasets import dataset_materials, dataset_paths, load_energy_axis, read_rows
+
+# built by histogram_persite_jsons.py (or histogram_per_site_5ev_limited.py for
+# dos_dataset_histogram_custom_5ev_limited.csv); channels are "<site>_<spin>"
+CSV_TO_CHECK = os.path.join("datasets", "output", "dos_dataset_histogram_custom.csv")
+JSON_FOLDER = os.path.join("datasets", "lsodos_persitejsons_250930")
+PLOT_DIR = os.path.join("datasets", "output", "plots", "comparison_persite_hist")
 os.makedirs(PLOT_DIR, exist_ok=True)
 
-RANDOM_SEED = 42  
+RANDOM_SEED = 42
+N_SAMPLES = 5
 
 random.seed(RANDOM_SEED)
 
-pairs = []
-for raw_file in os.listdir(RAW_DIR):
-    if raw_file.endswith("_raw.csv"):
-        hist_file = raw_file.replace("_raw.csv", "_hist.csv")
-        if os.path.exists(os.path.join(HIST_DIR, hist_file)):
-            pairs.append((raw_file, hist_file))
+with open(dataset_paths(CSV_TO_CHECK)["meta"], "r") as f:
+    channels = json.load(f)["channels"]
+materials = dataset_materials(CSV_TO_CHECK)
+bin_centers = load_energy_axis(CSV_TO_CHECK)
 
+pairs = [(material, channel) for material in materials for channel in range(len(channels))]
 if not pairs:
-    print("No matching raw/hist pairs found!")
+    print("No materials in the dataset!")
     exit()
 
-sample_pairs = random.sample(pairs, min(5, len(pairs)))
+sample_pairs = random.sample(pairs, min(N_SAMPLES, len(pairs)))
+df_hist = read_rows(CSV_TO_CHECK, sorted({material for material, _ in sample_pairs}))
+
+for material, channel in sample_pairs:
+    site_key, spin = channels[channel].split("_", 1)
+    row = df_hist[df_hist["material"] == material].iloc[0]
+    hist_dos = row[1:].to_numpy(dtype=float).reshape(len(channels), -1)[channel]
+
+    json_path = os.path.join(JSON_FOLDER, f"{material}_persite.json")
+    if not os.path.exists(json_path):
+        print(f"JSON for {material} not found, skipping")
+        continue
 
-for raw_file, hist_file in sample_pairs:
-    raw_path = os.path.join(RAW_DIR, raw_file)
-    hist_path = os.path.join(HIST_DIR, hist_file)
+    with open(json_path, "r") as f:
+        data = json.load(f)
 
-    raw_df = pd.read_csv(raw_path)
-    hist_df = pd.read_csv(hist_path)
+    site_data = data["tdos_per_site"][site_key]
+    raw_energies = np.array(site_data["energies"], dtype=float)
+    raw_dos = np.array(site_data["densities"][spin], dtype=float)
 
     fig, axes = plt.subplots(1, 2, figsize=(12, 5), sharey=True)
 
-    axes[0].plot(raw_df["Energy(eV)"], raw_df["DOS"], color="blue", linewidth=1)
+    axes[0].plot(raw_energies, raw_dos, color="blue", linewidth=1)
     axes[0].set_title("Raw DOS")
     axes[0].set_xlabel("Energy (eV)")
     axes[0].set_ylabel("DOS")
     axes[0].grid(True, linestyle="--", alpha=0.5)
 
-    axes[1].step(hist_df["Energy_center(eV)"], hist_df["DOS_binned"],
-                 where="mid", color="orange", linewidth=1)
+    axes[1].step(bin_centers, hist_dos, where="mid", color="orange", linewidth=1)
     axes[1].set_title("Histogrammed DOS")
     axes[1].set_xlabel("Energy (eV)")
     axes[1].grid(True, linestyle="--", alpha=0.5)
 
-    fig.suptitle(raw_file.replace("_raw.csv", ""), fontsize=10)
+    name = f"{material}_site{site_key}_spin{spin}"
+    fig.suptitle(name, fontsize=10)
     fig.tight_layout(rect=[0, 0.03, 1, 0.95])
 
-    out_name = raw_file.replace("_raw.csv", "_comparison_side_by_side.png")
+    out_name = f"{name}_comparison_side_by_side.png"
     out_path = os.path.join(PLOT_DIR, out_name)
     plt.savefig(out_path, dpi=150)
     plt.close()
@@ -0,0 +1,30 @@
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[6]))
+from lsodos.parallel import default_workers
+from lsodos.pipeline import DEFAULT_SPEC, load_spec, run_pipeline, select_datasets
+
+# Writes the BBAA, halides and tdos datasets of BBAA.py, halides.py and
+# tdos/tdos_from_per_site.py in a single pass over the per-site JSONs.
+
+N_WORKERS = default_workers()
+
+DATASETS = [
+    "bbaa_site0_spin1",
+    "bbaa_site0_spin-1",
+    "bbaa_site1_spin1",
+    "bbaa_site1_spin-1",
+    "bbaa_site2_spin1",
+    "bbaa_site2_spin-1",
+    "bbaa_site3_spin1",
+    "bbaa_site3_spin-1",
+    "bbaa_site4_spin1",
+    "bbaa_site4_spin-1",
+    "halides_spin1",
+    "halides_spin-1",
+    "persite_tdos_spin1",
+    "persite_tdos_spin-1",
+]
+
+run_pipeline(select_datasets(load_spec(DEFAULT_SPEC), DATASETS), n_workers=N_WORKERS)
@@ -1,9 +1,13 @@
 import os
 import json
 import random
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[6]))
+from lsodos.datasets import dataset_materials, load_energy_axis, read_rows
 
 CSV_TO_CHECK = os.path.join("datasets", "output", "per_site", "site0_spin-1.csv")
 SITE_KEY = "0"
@@ -17,12 +21,11 @@ N_SAMPLES = 5
 
 random.seed(RANDOM_SEED)
 
-df_hist = pd.read_csv(CSV_TO_CHECK)
-materials = df_hist["material"].tolist()
-energy_cols = df_hist.columns[1:]
-bin_centers = [float(col.split("=")[1].replace("eV", "")) for col in energy_cols]
+materials = dataset_materials(CSV_TO_CHECK)
+bin_centers = load_energy_axis(CSV_TO_CHECK)
 
 sample_materials = random.sample(materials, min(N_SAMPLES, len(materials)))
+df_hist = read_rows(CSV_TO_CHECK, sample_materials)
 
 for material in sample_materials:
     row = df_hist[df_hist["material"] == material].iloc[0]
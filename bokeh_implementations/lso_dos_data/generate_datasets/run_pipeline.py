@@ -0,0 +1,19 @@
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.parallel import default_workers
+from lsodos.pipeline import DEFAULT_SPEC, load_spec, run_pipeline, select_datasets
+
+# Builds every dataset in datasets.json, or in the spec file given as the first
+# argument, with one pass per corpus folder. Dataset names after the spec file
+# restrict the run to those datasets.
+
+spec_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SPEC
+spec = load_spec(spec_file)
+if len(sys.argv) > 2:
+    spec = select_datasets(spec, sys.argv[2:])
+
+N_WORKERS = default_workers()
+
+run_pipeline(spec, n_workers=N_WORKERS)
@@ -1,31 +1,34 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
 import json
 from pathlib import Path
 import os
 import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from lsodos.datasets import dataset_materials, load_energy_axis, read_rows
+from lsodos.longformat import LONG_DATASET, LongDataset
 
 random.seed(42)
-csv_long = os.path.join("datasets", "output", "dos_dataset_long.csv")
+long_file = LONG_DATASET
 csv_hist = os.path.join("datasets", "output", "dos_dataset_histogram_5_ev_cutoff_after_bandgap.csv")
 json_folder = Path("datasets/LSODOS")
 
-df_long = pd.read_csv(csv_long)
-df_hist = pd.read_csv(csv_hist)
-
-materials = df_hist["material"].unique().tolist()
+long_dataset = LongDataset(long_file)
+materials = dataset_materials(csv_hist)
 if len(materials) < 5:
     raise ValueError("Not enough materials to sample 5")
 selected = random.sample(materials, 5)
+df_hist = read_rows(csv_hist, selected)
+energies_hist = load_energy_axis(csv_hist)
 
 output_dir = os.path.join("plots", "comparison_long_vs_histogram")
 os.makedirs(output_dir, exist_ok=True)
 
 for material_name in selected:
-    subset = df_long[df_long["material"] == material_name]
+    subset = long_dataset.read(material_name)
     if subset.empty:
-        print(f"Skipping {material_name}: not found in long CSV")
+        print(f"Skipping {material_name}: not found in long dataset")
         continue
 
     energies_long = subset["energy"].values
@@ -36,7 +39,6 @@ for material_name in selected:
         continue
     row_hist = df_hist[df_hist["material"] == material_name].squeeze()
     energy_columns = [c for c in df_hist.columns if c != "material"]
-    energies_hist = np.array([float(c.replace("E=", "").replace("eV", "")) for c in energy_columns])
     dos_hist = row_hist[energy_columns].to_numpy(dtype=float)
 
     fig, axes = plt.subplots(1, 2, figsize=(12, 4), sharey=True)
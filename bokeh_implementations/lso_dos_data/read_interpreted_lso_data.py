@@ -1,16 +1,19 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
 import os
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from lsodos.datasets import load_energy_axis, read_rows
 
 material_name = "1131_CsTlAsCl_lsodos"  
 
 
 
 csv_file = os.path.join("datasets", "output", "dos_dataset_interpolated_10_ev_cutoff_after_bandgap.csv")
-df = pd.read_csv(csv_file)
+df = read_rows(csv_file, [material_name])
 
-if material_name not in df['material'].values:
+if df.empty:
     print(f"\nERROR: Material '{material_name}' not found in dataset!")
     exit()
 
@@ -18,17 +21,8 @@ material_row = df[df['material'] == material_name].squeeze()
 
 energy_columns = [col for col in df.columns if col != 'material']
 
-energies = []
-dos_values = []
-
-for col in energy_columns:
-    energy_str = col.replace("E=", "").replace("eV", "")
-    energy = float(energy_str)
-    energies.append(energy)
-    dos_values.append(material_row[col])
-
-energies = np.array(energies)
-dos_values = np.array(dos_values)
+energies = load_energy_axis(csv_file)
+dos_values = material_row[energy_columns].to_numpy(dtype=float)
 
 plt.figure(figsize=(10, 6))
 plt.plot(energies, dos_values, label="Total DOS", linewidth=1.5)
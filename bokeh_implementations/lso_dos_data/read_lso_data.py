@@ -1,20 +1,21 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import json
 from pathlib import Path
 import os
+import sys
 
-csv_file = os.path.join("datasets", "output", "dos_dataset_long.csv")
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from lsodos.longformat import LONG_DATASET, read_long_material
+
+long_file = LONG_DATASET
 json_folder = Path("datasets/LSODOS")  
 material_name = "1131_CsTlAsCl_lsodos" 
 
 
 
-df = pd.read_csv(csv_file)
-
-subset = df[df["material"] == material_name]
+subset = read_long_material(material_name, long_file)
 if subset.empty:
-    raise ValueError(f"Material {material_name} not found in {csv_file}")
+    raise ValueError(f"Material {material_name} not found in {long_file}")
 
 energies = subset["energy"].values
 dos = subset["tdos"].values
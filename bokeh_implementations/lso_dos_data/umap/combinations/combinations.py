@@ -2,14 +2,22 @@ import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MaxAbsScaler
 import umap
-from scipy import sparse
 from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, HoverTool, CategoricalColorMapper
 from bokeh.palettes import Category10
 import os
 import re
+from pathlib import Path
+import sys
 
-base_dir = os.path.join("datasets", "output", "combinations_full_range")
+sys.path.insert(0, str(Path(__file__).resolve().parents[4]))
+from lsodos.compress import channel_widths, compress
+from lsodos.datasets import load_aligned_datasets
+from lsodos.knn import precomputed_knn
+
+# "full_range", or "multires" for the same channels on the variable-width grid (see datasets.json)
+GRID = "full_range"
+base_dir = os.path.join("datasets", "output", f"combinations_{GRID}")
 combo1 = [
     os.path.join(base_dir, "BBAA", "site0_spin1.csv"),   # B1.up
     os.path.join(base_dir, "BBAA", "site1_spin1.csv"),   # B2.up
@@ -57,39 +65,25 @@ combo3_name = "tdosup_tdosdown_b1up_b1down_b2up_b2down_xup_xdown"
 combo4_name =  "b1up_b1down_b2up_b2down_xup_xdown"
 
 
+materials, X_sparse = load_aligned_datasets(combo1)
 
-import os
-import pandas as pd
-
-dfs = []
-for f in combo1:
-    df = pd.read_csv(f)
-    prefix = os.path.splitext(os.path.basename(f))[0]
-    df = df.rename(columns={c: f"{prefix}_{c}" for c in df.columns if c != "material"})
-    dfs.append(df)
-
-merged = dfs[0]
-for df in dfs[1:]:
-    merged = merged.merge(df, on="material", how="inner")
-
-print(f"Shape of first file ({halides_paths[0]}): {dfs[0].shape}")
-
-print(f"Merged dataset shape: {merged.shape}")
-print(merged.head())
-
-materials = merged["material"].values
-feature_columns = [c for c in merged.columns if c != "material"]
-X_sparse = sparse.csr_matrix(merged[feature_columns].values)
+print(f"Merged dataset shape: {X_sparse.shape}")
 
 N_NEIGHBORS = 15
 DISTANCE_METRIC = "cosine"
 DENSMAP = False
+# None, or "svd" / "rebin" to compress the stacked channels before UMAP (see lsodos.compress)
+COMPRESSION = None
 
 scaler = MaxAbsScaler()
 X_scaled = scaler.fit_transform(X_sparse)
+if COMPRESSION is not None:
+    X_scaled, _ = compress(X_scaled, COMPRESSION, widths=channel_widths(combo1), n_neighbors=N_NEIGHBORS,
+                           metric=DISTANCE_METRIC)
 
 print("started UMAP")
-reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42, densmap=DENSMAP)
+knn = precomputed_knn(X_scaled, N_NEIGHBORS, DISTANCE_METRIC, random_state=42)
+reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42, densmap=DENSMAP, precomputed_knn=knn)
 X_umap = reducer.fit_transform(X_scaled)
 print("finished UMAP")
 
@@ -104,7 +98,7 @@ def extract_halide(name: str) -> str:
 
 halides = [extract_halide(m) for m in materials]
 
-DIRECTORY = "combined_sparse_umap_halide_coloring_fullrange"
+DIRECTORY = f"combined_sparse_umap_halide_coloring_{GRID.replace('_', '')}"
 SAVING_DIR = os.path.join("bokehfiles", DIRECTORY)
 os.makedirs(SAVING_DIR, exist_ok=True)
 
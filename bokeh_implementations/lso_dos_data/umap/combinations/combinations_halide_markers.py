@@ -2,14 +2,22 @@ import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MaxAbsScaler
 import umap
-from scipy import sparse
 from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, HoverTool, LinearColorMapper, ColorBar, BasicTicker
 from bokeh.palettes import Viridis256
 import os
 import re
+from pathlib import Path
+import sys
 
-base_dir = os.path.join("datasets", "output", "combinations_full_range")
+sys.path.insert(0, str(Path(__file__).resolve().parents[4]))
+from lsodos.compress import channel_widths, compress
+from lsodos.datasets import join_properties, load_aligned_datasets
+from lsodos.knn import precomputed_knn
+
+# "full_range", or "multires" for the same channels on the variable-width grid (see datasets.json)
+GRID = "full_range"
+base_dir = os.path.join("datasets", "output", f"combinations_{GRID}")
 combo1 = [
     os.path.join(base_dir, "BBAA", "site0_spin1.csv"),   # B1.up
     os.path.join(base_dir, "BBAA", "site1_spin1.csv"),   # B2.up
@@ -56,40 +64,31 @@ combo2_name = "tdosup_tdosdown_b1up_b1down_b2up_b2down"
 combo3_name = "tdosup_tdosdown_b1up_b1down_b2up_b2down_xup_xdown"
 combo4_name =  "b1up_b1down_b2up_b2down_xup_xdown"
 
-dfs = []
-for f in combo4:
-    df = pd.read_csv(f)
-    prefix = os.path.splitext(os.path.basename(f))[0]
-    df = df.rename(columns={c: f"{prefix}_{c}" for c in df.columns if c != "material"})
-    dfs.append(df)
-
-merged = dfs[0]
-for df in dfs[1:]:
-    merged = merged.merge(df, on="material", how="inner")
-
-print(f"Shape of first file ({halides_paths[0]}): {dfs[0].shape}")
+materials, X_sparse = load_aligned_datasets(combo4)
 
-print(f"Merged dataset shape: {merged.shape}")
-print(merged.head())
+print(f"Merged dataset shape: {X_sparse.shape}")
 
 bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
 bandgap_df = pd.read_csv(bandgap_csv_file)
-merged = merged.merge(bandgap_df, on="material", how="inner")
+materials, X_sparse, properties = join_properties(materials, X_sparse, bandgap_df)
 
-materials = merged["material"].values
-bandgaps = merged["bandgap"].values
-feature_columns = [c for c in merged.columns if c not in ["material", "bandgap"]]
-X_sparse = sparse.csr_matrix(merged[feature_columns].values)
+bandgaps = properties["bandgap"].values
 
 N_NEIGHBORS = 15
 DISTANCE_METRIC = "cosine"
 DENSMAP = False
+# None, or "svd" / "rebin" to compress the stacked channels before UMAP (see lsodos.compress)
+COMPRESSION = None
 
 scaler = MaxAbsScaler()
 X_scaled = scaler.fit_transform(X_sparse)
+if COMPRESSION is not None:
+    X_scaled, _ = compress(X_scaled, COMPRESSION, widths=channel_widths(combo4), n_neighbors=N_NEIGHBORS,
+                           metric=DISTANCE_METRIC)
 
 print("started UMAP")
-reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42, densmap=DENSMAP)
+knn = precomputed_knn(X_scaled, N_NEIGHBORS, DISTANCE_METRIC, random_state=42)
+reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42, densmap=DENSMAP, precomputed_knn=knn)
 X_umap = reducer.fit_transform(X_scaled)
 print("finished UMAP")
 
@@ -105,7 +104,7 @@ def extract_halide(name: str) -> str:
 halides = [extract_halide(m) for m in materials]
 unique_halides = sorted(set(halides))
 
-DIRECTORY = "combined_sparse_umap_bandgap_color_halide_marker_fullrange"
+DIRECTORY = f"combined_sparse_umap_bandgap_color_halide_marker_{GRID.replace('_', '')}"
 SAVING_DIR = os.path.join("bokehfiles", DIRECTORY)
 os.makedirs(SAVING_DIR, exist_ok=True)
 
@@ -0,0 +1,22 @@
+import os
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.embedding import embedding_for
+
+bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
+
+N_NEIGHBORS = 15
+DISTANCE_METRIC = "cosine"
+DENSMAP = True
+
+# the embeddings halide_coloring.py, halide_markers.py and magnom_coloring.py render from
+DATASETS = [
+    os.path.join("datasets", "output", "dos_dataset_histogram_custom.csv"),
+    os.path.join("datasets", "output", "dos_dataset_histogram_5_ev_cutoff_after_bandgap.csv"),
+]
+
+for csv_file in DATASETS:
+    embedding_for(csv_file, N_NEIGHBORS, DISTANCE_METRIC, densmap=DENSMAP, random_state=42,
+                  properties_file=bandgap_csv_file)
@@ -1,36 +1,26 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MaxAbsScaler
-import umap
-from scipy import sparse
 from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, HoverTool, CategoricalColorMapper
 from bokeh.palettes import Category10
 import os
 import re
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.embedding import embedding_for
 
 csv_file = os.path.join("datasets", "output", "dos_dataset_histogram_custom.csv")
 bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
 
-dos_df = pd.read_csv(csv_file)
-bandgap_df = pd.read_csv(bandgap_csv_file)
-df = dos_df.merge(bandgap_df, on="material", how="inner")
-
-materials = df["material"].values
-energy_columns = [col for col in df.columns if col not in ["material", "bandgap"]]
-X_sparse = sparse.csr_mat+   rix(df[energy_columns].values)
-
 N_NEIGHBORS = 15
 DISTANCE_METRIC = "cosine"
 DENSMAP = True
 
-scaler = MaxAbsScaler()
-X_scaled = scaler.fit_transform(X_sparse)
-
-print("started UMAP")
-reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42, densmap=DENSMAP)
-X_umap = reducer.fit_transform(X_scaled)
-print("finished UMAP")
+embedding = embedding_for(csv_file, N_NEIGHBORS, DISTANCE_METRIC, densmap=DENSMAP, random_state=42,
+                          properties_file=bandgap_csv_file)
+materials, X_umap = embedding["materials"], embedding["embedding"]
 
 HALIDES = ['Cl', 'Br', 'I', 'F', 'At', 'Ts']
 def extract_halide(name: str) -> str:
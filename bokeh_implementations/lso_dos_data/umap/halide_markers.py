@@ -1,38 +1,30 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MaxAbsScaler
-import umap
-from scipy import sparse
 from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, HoverTool, LinearColorMapper, ColorBar, BasicTicker
 from bokeh.palettes import Viridis256
 import os
 import re
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.datasets import join_properties
+from lsodos.embedding import embedding_for
 
 csv_file = os.path.join("datasets", "output", "dos_dataset_histogram_5_ev_cutoff_after_bandgap.csv")
 bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
 
-dos_df = pd.read_csv(csv_file)
-bandgap_df = pd.read_csv(bandgap_csv_file)
-df = dos_df.merge(bandgap_df, on="material", how="inner")
-
-materials = df["material"].values
-bandgaps = df["bandgap"].values
-energy_columns = [c for c in df.columns if c not in ["material", "bandgap"]]
-
-X_sparse = sparse.csr_matrix(df[energy_columns].values)
-
 N_NEIGHBORS = 15
 DISTANCE_METRIC = "cosine"
 DENSMAP = True
 
-scaler = MaxAbsScaler()
-X_scaled = scaler.fit_transform(X_sparse)
+embedding = embedding_for(csv_file, N_NEIGHBORS, DISTANCE_METRIC, densmap=DENSMAP, random_state=42,
+                          properties_file=bandgap_csv_file)
+materials, X_umap, properties = join_properties(embedding["materials"], embedding["embedding"],
+                                                pd.read_csv(bandgap_csv_file))
 
-print("started UMAP")
-reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42, densmap=DENSMAP)
-X_umap = reducer.fit_transform(X_scaled)
-print("finished UMAP")
+bandgaps = properties["bandgap"].values
 
 HALIDES = ['Cl', 'Br', 'I', 'F', 'At', 'Ts']
 def extract_halide(name: str) -> str:
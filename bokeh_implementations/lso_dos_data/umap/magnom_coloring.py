@@ -1,37 +1,29 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MaxAbsScaler
-import umap
-from scipy import sparse
 from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, HoverTool
 import os
 import re
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.datasets import join_properties
+from lsodos.embedding import embedding_for
 
 base_csv = os.path.join("datasets", "output", "dos_dataset_histogram_5_ev_cutoff_after_bandgap.csv")
 magmom_csv = os.path.join("datasets", "output", "material_bandgap.csv")  # file with magmom_tot_lobster column
 
-dos_df = pd.read_csv(base_csv)
-magmom_df = pd.read_csv(magmom_csv)
-df = dos_df.merge(magmom_df, on="material", how="inner")
-
-materials = df["material"].values
-magmoms = df["magmom_tot_lobster"].values
-energy_columns = [c for c in df.columns if c not in ["material", "magmom_tot_lobster"]]
-
-X_sparse = sparse.csr_matrix(df[energy_columns].values)
-
 N_NEIGHBORS = 15
 DISTANCE_METRIC = "cosine"
 DENSMAP = True
 
-scaler = MaxAbsScaler()
-X_scaled = scaler.fit_transform(X_sparse)
+embedding = embedding_for(base_csv, N_NEIGHBORS, DISTANCE_METRIC, densmap=DENSMAP, random_state=42,
+                          properties_file=magmom_csv)
+materials, X_umap, properties = join_properties(embedding["materials"], embedding["embedding"],
+                                                pd.read_csv(magmom_csv))
 
-print("started UMAP")
-reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42, densmap=DENSMAP)
-X_umap = reducer.fit_transform(X_scaled)
-print("finished UMAP")
+magmoms = properties["magmom_tot_lobster"].values
 
 HALIDES = ['Cl', 'Br', 'I', 'F', 'At', 'Ts']
 def extract_halide(name: str) -> str:
@@ -0,0 +1,34 @@
+import os
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.reducer import drift, model_for, new_files, place
+
+# place new DOS files into the umap_data.py map without refitting it:
+#   python place_new_materials.py [file.json ...]
+# without arguments every file in the dataset's folder whose material was not in the dataset when the
+# model was fitted is placed (materials left out of the fit for lack of a bandgap are not "new")
+csv_file = os.path.join("datasets", "output", "dos_dataset_histogram_custom.csv")
+bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
+
+N_NEIGHBORS = 15
+DISTANCE_METRIC = "euclidean"
+REFIT = "--refit" in sys.argv
+
+model = model_for(csv_file, N_NEIGHBORS, DISTANCE_METRIC, random_state=42, properties_file=bandgap_csv_file,
+                  refit=REFIT)
+
+fpaths = [arg for arg in sys.argv[1:] if arg != "--refit"]
+if not fpaths:
+    fpaths = new_files(model)
+
+materials, coordinates = place(model, fpaths)
+for material, (x, y) in zip(materials, coordinates):
+    print(f"{material}: x={x:.3f}, y={y:.3f}")
+
+summary = drift(model)
+print(f"Placed {summary['placed']} material(s) since the fit "
+      f"({summary['fraction']:.1%} of {len(model['materials'])}), median novelty {summary['novelty']:.2f}")
+if summary["needs_refit"]:
+    print("Drift is above the refit threshold: rerun with --refit")
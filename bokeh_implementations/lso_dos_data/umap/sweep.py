@@ -0,0 +1,100 @@
+import pandas as pd
+from bokeh.plotting import figure, output_file, save
+from bokeh.models import ColumnDataSource, HoverTool
+from bokeh.models import LinearColorMapper, ColorBar, BasicTicker
+from bokeh.palettes import Viridis256
+import html
+import os
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.datasets import join_properties
+from lsodos.sweep import load_sweep, run_sweep, sweep_grid
+
+csv_file = os.path.join("datasets", "output", "dos_dataset_histogram_5_ev_cutoff_after_bandgap.csv")
+bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
+
+N_NEIGHBORS = [10, 15, 20, 30]
+DISTANCE_METRICS = ["euclidean", "cosine"]
+MIN_DISTS = [0.1]
+DENSMAPS = [False, True]
+
+grid = sweep_grid(N_NEIGHBORS, DISTANCE_METRICS, MIN_DISTS, DENSMAPS, random_state=42,
+                  properties_file=bandgap_csv_file)
+paths = run_sweep(csv_file, grid, properties_file=bandgap_csv_file)
+
+DATASET_NAME = os.path.splitext(os.path.basename(csv_file))[0]
+SAVING_DIR = os.path.join("bokehfiles", f"sweep_{DATASET_NAME}")
+os.makedirs(SAVING_DIR, exist_ok=True)
+
+MATERIAL_STRING = "material"
+X_AXIS_STRING = "x"
+Y_AXIS_STRING = "y"
+BANDGAP_STRING = "bandgap"
+
+bandgap_df = pd.read_csv(bandgap_csv_file)
+index_rows = []
+
+for embedding in load_sweep(paths):
+    params = embedding["params"]
+    materials, X_umap, properties = join_properties(embedding["materials"], embedding["embedding"], bandgap_df)
+
+    plot_df = pd.DataFrame({
+        MATERIAL_STRING: materials,
+        X_AXIS_STRING: X_umap[:, 0],
+        Y_AXIS_STRING: X_umap[:, 1],
+        BANDGAP_STRING: properties[BANDGAP_STRING].values
+    })
+
+    color_mapping = LinearColorMapper(
+        palette=Viridis256,
+        low=float(plot_df[BANDGAP_STRING].min()),
+        high=float(plot_df[BANDGAP_STRING].max())
+    )
+
+    label = (f"{params['n_neighbors']} neighbors, {params['metric']}, "
+             f"min_dist {params['min_dist']}, densmap {params['densmap']}")
+    plot = figure(
+        title=f"UMAP projection of {DATASET_NAME} ({label})",
+        width=800, height=800,
+        tools="pan,wheel_zoom,box_zoom,reset,hover,save",
+        active_scroll="wheel_zoom"
+    )
+    plot.scatter(X_AXIS_STRING, Y_AXIS_STRING, source=ColumnDataSource(plot_df), size=6, alpha=0.7,
+                 color={"field": BANDGAP_STRING, "transform": color_mapping})
+    plot.select_one(HoverTool).tooltips = [
+        ("Material", f"@{MATERIAL_STRING}"),
+        ("Bandgap", f"@{BANDGAP_STRING}{{0.00}} eV"),
+    ]
+    plot.xaxis.axis_label = X_AXIS_STRING
+    plot.yaxis.axis_label = Y_AXIS_STRING
+    plot.add_layout(ColorBar(color_mapper=color_mapping, ticker=BasicTicker(), label_standoff=8,
+                             location=(0, 0), title="Bandgap (eV)"), "right")
+
+    FILE_NAME = (f"{DATASET_NAME}_{params['n_neighbors']}_neighbors_{params['metric']}_"
+                 f"min_dist_{params['min_dist']}_densmap_{params['densmap']}.html")
+    output_file(os.path.join(SAVING_DIR, FILE_NAME))
+    save(plot)
+    index_rows.append((params, FILE_NAME))
+
+table_rows = "\n".join(
+    f"<tr><td>{p['n_neighbors']}</td><td>{html.escape(p['metric'])}</td><td>{p['min_dist']}</td>"
+    f"<td>{p['densmap']}</td><td><a href=\"{html.escape(name)}\">{html.escape(name)}</a></td></tr>"
+    for p, name in index_rows
+)
+with open(os.path.join(SAVING_DIR, "index.html"), "w") as f:
+    f.write(f"""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>UMAP sweep of {html.escape(DATASET_NAME)}</title></head>
+<body>
+<h1>UMAP sweep of {html.escape(DATASET_NAME)}</h1>
+<table>
+<tr><th>n_neighbors</th><th>metric</th><th>min_dist</th><th>densmap</th><th>plot</th></tr>
+{table_rows}
+</table>
+</body>
+</html>
+""")
+
+print(f"Sweep index saved to {os.path.join(SAVING_DIR, 'index.html')}")
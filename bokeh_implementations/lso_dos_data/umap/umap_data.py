@@ -1,10 +1,5 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.preprocessing import MaxAbsScaler
-import umap
-
-from scipy import sparse
 
 from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, HoverTool
@@ -12,33 +7,24 @@ from bokeh.models import LinearColorMapper, ColorBar, BasicTicker
 from bokeh.palettes import Viridis256
 
 import os
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from lsodos.datasets import join_properties
+from lsodos.embedding import embedding_for
 
 csv_file = os.path.join("datasets", "output", "dos_dataset_histogram_custom.csv")
 bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
 
-dos_df = pd.read_csv(csv_file)
-bandgap_df = pd.read_csv(bandgap_csv_file)
-
-df = dos_df.merge(bandgap_df, on="material", how="inner")
-
-
-materials = df["material"].values
-bandgaps = df["bandgap"].values
-
-energy_columns = [col for col in df.columns if col != "material"]
-
-X_sparse = sparse.csr_matrix(df[energy_columns].values)
-
 N_NEIGHBORS = 15
 DISTANCE_METRIC = "euclidean"
 
-scaler = MaxAbsScaler()
-X_scaled = scaler.fit_transform(X_sparse)
+embedding = embedding_for(csv_file, N_NEIGHBORS, DISTANCE_METRIC, random_state=42, properties_file=bandgap_csv_file)
+materials, X_umap, properties = join_properties(embedding["materials"], embedding["embedding"],
+                                                pd.read_csv(bandgap_csv_file))
 
-print("started UMAP")
-reducer = umap.UMAP(n_neighbors=N_NEIGHBORS, metric=DISTANCE_METRIC, random_state=42)
-X_umap = reducer.fit_transform(X_scaled)
-print("finished UMAP")
+bandgaps = properties["bandgap"].values
 
 DIRECTORY = "dos_sparse_histogram_custom_bandgap_coloring"
 
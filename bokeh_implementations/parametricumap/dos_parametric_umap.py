@@ -0,0 +1,93 @@
+import pandas as pd
+
+from bokeh.plotting import figure, output_file, save
+from bokeh.models import ColumnDataSource, HoverTool
+from bokeh.models import LinearColorMapper, ColorBar, BasicTicker
+from bokeh.palettes import Viridis256
+
+import os
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from lsodos.datasets import join_properties
+from lsodos.parametric import embed_files, parametric_for
+
+# train (once) a parametric UMAP encoder on a DOS dataset and plot it:
+#   python dos_parametric_umap.py [--retrain] [file.json ...]
+# DOS files given as arguments are embedded with the encoder and drawn on top of the map
+csv_file = os.path.join("datasets", "output", "dos_dataset_histogram_custom.csv")
+bandgap_csv_file = os.path.join("datasets", "output", "material_bandgap.csv")
+
+N_NEIGHBORS = 15
+DISTANCE_METRIC = "euclidean"
+RETRAIN = "--retrain" in sys.argv
+
+model = parametric_for(csv_file, N_NEIGHBORS, DISTANCE_METRIC, random_state=42, properties_file=bandgap_csv_file,
+                       retrain=RETRAIN)
+materials, X_umap, properties = join_properties(model["materials"], model["embedding"],
+                                                pd.read_csv(bandgap_csv_file))
+
+fpaths = [arg for arg in sys.argv[1:] if arg != "--retrain"]
+new_materials, new_X_umap = embed_files(model, fpaths)
+for material, (x, y) in zip(new_materials, new_X_umap):
+    print(f"{material}: x={x:.3f}, y={y:.3f}")
+
+SAVING_DIR = os.path.join("bokehfiles", "dos_parametric_umap")
+os.makedirs(SAVING_DIR, exist_ok=True)
+
+DATASET_NAME = os.path.splitext(os.path.basename(csv_file))[0]
+FILE_NAME = f"{DATASET_NAME}_parametric_{N_NEIGHBORS}_neighbors_{DISTANCE_METRIC}.html"
+
+MATERIAL_STRING = "material"
+X_AXIS_STRING = "x"
+Y_AXIS_STRING = "y"
+BANDGAP_STRING = "bandgap"
+
+plot_df = pd.DataFrame({
+    MATERIAL_STRING: materials,
+    X_AXIS_STRING: X_umap[:, 0],
+    Y_AXIS_STRING: X_umap[:, 1],
+    BANDGAP_STRING: properties[BANDGAP_STRING].values
+})
+
+color_mapping = LinearColorMapper(
+    palette=Viridis256,
+    low=float(plot_df[BANDGAP_STRING].min()),
+    high=float(plot_df[BANDGAP_STRING].max())
+)
+
+plot = figure(
+    title=f"Parametric UMAP projection of {DATASET_NAME} with {N_NEIGHBORS} neighbors ({DISTANCE_METRIC} metric)",
+    width=800, height=800,
+    tools="pan,wheel_zoom,box_zoom,reset,hover,save",
+    active_scroll="wheel_zoom"
+)
+
+plot.scatter(X_AXIS_STRING, Y_AXIS_STRING, source=ColumnDataSource(plot_df), size=6, alpha=0.7,
+             color={"field": BANDGAP_STRING, "transform": color_mapping})
+
+if len(new_materials):
+    new_df = pd.DataFrame({
+        MATERIAL_STRING: new_materials,
+        X_AXIS_STRING: new_X_umap[:, 0],
+        Y_AXIS_STRING: new_X_umap[:, 1],
+    })
+    plot.scatter(X_AXIS_STRING, Y_AXIS_STRING, source=ColumnDataSource(new_df), size=10, marker="x",
+                 color="red", legend_label="new materials")
+
+plot.select_one(HoverTool).tooltips = [
+    ("Material", f"@{MATERIAL_STRING}"),
+    (X_AXIS_STRING, f"@{X_AXIS_STRING}{{0.00}}"),
+    (Y_AXIS_STRING, f"@{Y_AXIS_STRING}{{0.00}}"),
+]
+
+plot.xaxis.axis_label = X_AXIS_STRING
+plot.yaxis.axis_label = Y_AXIS_STRING
+plot.add_layout(ColorBar(color_mapper=color_mapping, ticker=BasicTicker(), label_standoff=8,
+                         location=(0, 0), title="Bandgap (eV)"), "right")
+
+output_file(os.path.join(SAVING_DIR, FILE_NAME))
+save(plot)
+
+print(f"Bokeh plot saved to {os.path.join(SAVING_DIR, FILE_NAME)}")
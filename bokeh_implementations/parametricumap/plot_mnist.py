@@ -8,15 +8,29 @@ from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, HoverTool, CategoricalColorMapper
 from bokeh.palettes import Category10
 
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from lsodos.parametric import stream_encode
+
 model_path = os.path.join("bokeh_implementations", "parametricumap", "mnist_model")
 embedder = load_ParametricUMAP(model_path)
 
 (x_train, y_train), (_, _) = mnist.load_data()
-x_train = x_train.astype("float32") / 255.0
-x_train = x_train.reshape((x_train.shape[0], -1))
+
+BLOCK_SIZE = 4096
+
+
+def scaled_blocks(images):
+    # scale and flatten a block at a time instead of the whole float32 train set
+    for start in range(0, images.shape[0], BLOCK_SIZE):
+        block = images[start:start + BLOCK_SIZE]
+        yield block.reshape((block.shape[0], -1)).astype("float32") / 255.0
 
 
-X_umap = embedder.transform(x_train)
+embedding_file = os.path.join(model_path, "mnist_train_embedding.npy")
+X_umap = stream_encode(embedder.encoder, scaled_blocks(x_train), embedding_file, n_rows=x_train.shape[0])
 
 DIGIT_STRING = "digit"
 X_AXIS_STRING = "x"
@@ -0,0 +1 @@
+"""Shared helpers for reading the LSODOS DOS corpus and building datasets from it."""
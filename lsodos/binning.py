@@ -0,0 +1,215 @@
+"""Batched histogram binning that reproduces ``np.histogram`` bit for bit.
+
+``np.histogram(a, bins=edges, weights=w)`` with an edge array sorts ``a``,
+takes a cumulative sum of the weights and differences it at
+``searchsorted(a, edges)``. Here the bin index of every sample is computed
+arithmetically on the (uniform) grid and corrected against the actual edges,
+so there is no binary search against the ~16k edges, and any number of rows
+(channels, sites, materials) are binned in one ``np.bincount`` plus one
+cumulative sum. The cumulative-sum-and-difference step is kept on purpose: it
+is what makes the output identical to the existing datasets, down to how
+samples outside the grid shift the running sum. Only occupied bins are
+evaluated, so the work is linear in the number of samples. With numba
+installed the whole batch runs in one compiled loop; otherwise the same
+arithmetic is done with vectorized numpy. Grids whose spacing changes with
+energy (``multiresolution_grid``) take one ``np.searchsorted`` per sample
+against their edges instead, which are far fewer.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# np.histogram accumulates rows longer than this block by block, which changes
+# the rounding; such rows go through np.histogram itself.
+NUMPY_BLOCK = 65536
+
+
+def multiresolution_grid(emin, emax, steps):
+    """Grid points from ``emin`` to ``emax`` whose spacing changes with energy.
+
+    ``steps`` are ``(start, dE)`` pairs with increasing starts; each spacing
+    applies from its start up to the next one, and the lowest one from
+    ``emin`` whatever its start. The topmost step is laid out like a uniform
+    grid, ``np.arange(start, emax + dE, dE)``, so a single step gives exactly
+    the uniform grid. Each lower step is laid out downwards from the first
+    point above it in whole steps until it reaches its start (the lowest one
+    until it covers ``emin``), so every interval has the width of its step and
+    no samples at ``emin`` are lost.
+    """
+    starts = [start for start, _ in steps]
+    if not steps or any(b <= a for a, b in zip(starts, starts[1:])):
+        raise ValueError(f"grid steps need increasing starts, got {starts}")
+    if any(dE <= 0 for _, dE in steps):
+        raise ValueError(f"grid steps need positive spacings, got {[dE for _, dE in steps]}")
+    # steps that end below emin or start above emax do not contribute
+    steps = [(start, dE) for i, (start, dE) in enumerate(steps)
+             if (i == 0 or start < emax) and (i + 1 == len(steps) or steps[i + 1][0] > emin)]
+    steps[0] = (emin, steps[0][1])
+
+    start, dE = steps[-1]
+    points = np.arange(start, emax + dE, dE)
+    for start, dE in reversed(steps[:-1]):
+        top = points[0]
+        n = max(int(np.ceil((top - start) / dE)), 0)
+        while top - n * dE > start:
+            n += 1
+        points = np.concatenate((top - dE * np.arange(n, 0, -1), points))
+    return points
+
+
+def is_uniform(bin_edges, rtol=1e-6):
+    widths = np.diff(bin_edges)
+    return len(widths) > 0 and np.all(np.abs(widths - widths.mean()) <= rtol * abs(widths.mean()))
+
+
+def bin_index(values, bin_edges, uniform=None):
+    """Bin of each value as np.histogram assigns it.
+
+    Returns -1 below the first edge and ``nbins`` above the last one; the last
+    bin includes its right edge.
+    """
+    values = np.asarray(values)
+    nbins = len(bin_edges) - 1
+    if uniform is None:
+        uniform = is_uniform(bin_edges)
+
+    if uniform:
+        first, last = bin_edges[0], bin_edges[-1]
+        idx = ((values - first) * (nbins / (last - first))).astype(np.intp)
+        np.clip(idx, 0, nbins - 1, out=idx)
+        # the estimate can be one bin off where rounding puts a value next to
+        # an edge; settle it against the edges np.arange actually produced
+        idx -= (values < bin_edges[idx]) & (idx > 0)
+        idx += (values >= bin_edges[idx + 1]) & (idx < nbins - 1)
+    else:
+        idx = np.searchsorted(bin_edges, values, side="right") - 1
+        idx[values == bin_edges[-1]] = nbins - 1
+
+    idx[values < bin_edges[0]] = -1
+    idx[values > bin_edges[-1]] = nbins
+    return idx
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _histogram_rows(values, weights, row_offsets, bin_edges, uniform, out):
+        nbins = len(bin_edges) - 1
+        first, last = bin_edges[0], bin_edges[-1]
+        scale = nbins / (last - first)
+        running = np.zeros(1, dtype=out.dtype)
+        for r in range(len(row_offsets) - 1):
+            running[0] = 0
+            run_start = running[0]
+            run_bin = -2
+            for k in range(row_offsets[r], row_offsets[r + 1]):
+                v = values[k]
+                if v < first:
+                    b = -1
+                elif v > last:
+                    b = nbins
+                elif uniform:
+                    b = min(max(int((v - first) * scale), 0), nbins - 1)
+                    if b > 0 and v < bin_edges[b]:
+                        b -= 1
+                    elif b < nbins - 1 and v >= bin_edges[b + 1]:
+                        b += 1
+                else:
+                    b = np.searchsorted(bin_edges, v, side="right") - 1
+                    if b == nbins:
+                        b = nbins - 1
+                if b != run_bin:
+                    if 0 <= run_bin < nbins:
+                        out[r, run_bin] = running[0] - run_start
+                    run_bin = b
+                    run_start = running[0]
+                running[0] += weights[k]
+            if 0 <= run_bin < nbins:
+                out[r, run_bin] = running[0] - run_start
+
+
+def histogram_batch(energies_list, weights_list, bin_edges):
+    """Weighted histograms of many rows on one grid, shape ``(rows, nbins)``.
+
+    Row ``i`` equals ``np.histogram(energies_list[i], bins=bin_edges,
+    weights=weights_list[i])[0]`` exactly.
+    """
+    bin_edges = np.asarray(bin_edges)
+    nbins = len(bin_edges) - 1
+    n_rows = len(energies_list)
+    dtype = np.result_type(*[np.asarray(w).dtype for w in weights_list]) if n_rows else np.float64
+    out = np.zeros((n_rows, nbins), dtype=dtype)
+    if n_rows == 0:
+        return out
+
+    batch_rows, sorted_energies, sorted_weights = [], [], []
+    for i, (energies, weights) in enumerate(zip(energies_list, weights_list)):
+        energies = np.asarray(energies)
+        weights = np.asarray(weights)
+        if len(energies) > NUMPY_BLOCK:
+            out[i], _ = np.histogram(energies, bins=bin_edges, weights=weights)
+            continue
+        if len(energies) > 1 and not np.all(energies[1:] > energies[:-1]):
+            order = np.argsort(energies)
+            energies, weights = energies[order], weights[order]
+        batch_rows.append(i)
+        sorted_energies.append(energies)
+        sorted_weights.append(weights)
+    if not batch_rows:
+        return out
+
+    lengths = np.array([len(e) for e in sorted_energies])
+    if lengths.sum() == 0:
+        return out
+
+    if njit is not None:
+        batch_out = np.zeros((len(batch_rows), nbins), dtype=dtype)
+        row_offsets = np.concatenate(([0], np.cumsum(lengths)))
+        _histogram_rows(
+            np.concatenate(sorted_energies).astype(np.float64),
+            np.concatenate(sorted_weights).astype(dtype),
+            row_offsets,
+            bin_edges.astype(np.float64),
+            bool(is_uniform(bin_edges)),
+            batch_out,
+        )
+        out[batch_rows] = batch_out
+        return out
+
+    max_len = lengths.max()
+    n_batch = len(batch_rows)
+
+    # running sum of the weights per row, padded at the end (np.cumsum along
+    # the last axis adds in the same order as it does for each row alone)
+    padded = np.zeros((n_batch, max_len + 1), dtype=dtype)
+    for j, weights in enumerate(sorted_weights):
+        padded[j, 1:len(weights) + 1] = weights
+    cumulative = np.cumsum(padded, axis=1).ravel()
+
+    # With every row sorted, the samples of one (row, bin) pair are a
+    # contiguous run, and np.histogram's value for that bin is the running sum
+    # at the end of the run minus the one at its start. Empty bins come out as
+    # exactly zero there too, so only the occupied bins need touching.
+    values = np.concatenate(sorted_energies)
+    row_id = np.repeat(np.arange(n_batch), lengths)
+    bins = bin_index(values, bin_edges)
+    key = row_id * (nbins + 2) + bins + 1
+    run_start = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+    run_end = np.append(run_start[1:], len(key))
+
+    row_offset = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    run_row = row_id[run_start]
+    run_bin = bins[run_start]
+    base = run_row * (max_len + 1) - row_offset[run_row]
+    sums = cumulative[base + run_end] - cumulative[base + run_start]
+
+    inside = (run_bin >= 0) & (run_bin < nbins)
+    rows = np.asarray(batch_rows)[run_row[inside]]
+    out[rows, run_bin[inside]] = sums[inside]
+    return out
+
+
+def histogram(energies, weights, bin_edges):
+    return histogram_batch([energies], [weights], bin_edges)[0]
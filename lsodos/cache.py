@@ -0,0 +1,140 @@
+"""Content-addressed cache of built datasets.
+
+An entry is keyed on everything that determines a dataset's contents: the
+channels and options of its spec, the exact grid (so emin, emax, dE and the
+mode) and a fingerprint of the corpus folder (file names, mtimes and sizes).
+Entries hold copies of the dataset files (see ``lsodos.datasets``); a hit
+copies them back to the requested ``out_file`` without reading the corpus.
+
+The cache lives in ``datasets/output/cache`` and is kept under a size cap by
+evicting the least recently used entries.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from lsodos.datasets import dataset_paths
+
+CACHE_DIR = os.path.join("datasets", "output", "cache")
+CACHE_MB_ENV = "LSODOS_CACHE_MB"
+DEFAULT_CACHE_MB = 4096
+CACHE_VERSION = 1
+ENTRY_FILE = "entry.json"
+
+
+def max_cache_bytes():
+    """Size cap from $LSODOS_CACHE_MB, else ``DEFAULT_CACHE_MB``."""
+    value = os.environ.get(CACHE_MB_ENV)
+    return int(float(value) * 2**20) if value else DEFAULT_CACHE_MB * 2**20
+
+
+def corpus_fingerprint(index):
+    files = sorted((fname, entry["mtime_ns"], entry["size"]) for fname, entry in index["files"].items())
+    return hashlib.sha256(json.dumps(files).encode()).hexdigest()
+
+
+def dataset_key(dataset, mode, points, fingerprint):
+    """Hash of a normalized pipeline dataset, its resolved grid and the corpus."""
+    payload = {
+        "version": CACHE_VERSION,
+        "channels": [[group if isinstance(group, str) else list(group), spin] for group, spin in dataset["channels"]],
+        "channel_labels": dataset["channel_labels"],
+        "require_b2": dataset["require_b2"],
+        "drop_empty": dataset["drop_empty"],
+        "formats": sorted(dataset["formats"]),
+        "dtype": dataset["dtype"],
+        "mode": mode,
+        "grid": hashlib.sha256(points.tobytes()).hexdigest(),
+        "corpus": fingerprint,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def entry_dir(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, key)
+
+
+def _read_entry(path):
+    try:
+        with open(os.path.join(path, ENTRY_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(path, entry):
+    tmp_path = os.path.join(path, ENTRY_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, os.path.join(path, ENTRY_FILE))
+
+
+def restore(key, out_file, cache_dir=CACHE_DIR):
+    """Copy a cached dataset to ``out_file``; returns False on a miss."""
+    path = entry_dir(key, cache_dir)
+    entry = _read_entry(path)
+    if entry is None:
+        return False
+    targets = dataset_paths(out_file)
+    os.makedirs(os.path.dirname(out_file) or ".", exist_ok=True)
+    for kind, name in entry["files"].items():
+        shutil.copy2(os.path.join(path, name), targets[kind])
+    # files of the dataset the entry does not have belong to another build
+    for kind, target in targets.items():
+        if kind not in entry["files"] and os.path.exists(target):
+            os.remove(target)
+    entry["last_used"] = time.time()
+    _write_entry(path, entry)
+    return True
+
+
+def store(key, out_file, description=None, cache_dir=CACHE_DIR):
+    """Copy the files of a freshly built dataset into the cache under ``key``."""
+    path = entry_dir(key, cache_dir)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    files = {}
+    size = 0
+    for kind, source in dataset_paths(out_file).items():
+        if not os.path.exists(source):
+            continue
+        name = "dataset" + source[len(os.path.splitext(out_file)[0]):]
+        shutil.copy2(source, os.path.join(tmp_path, name))
+        files[kind] = name
+        size += os.path.getsize(source)
+
+    _write_entry(tmp_path, {"key": key, "description": description, "files": files,
+                            "size": size, "last_used": time.time()})
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def entries(cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return []
+    found = []
+    for key in os.listdir(cache_dir):
+        entry = _read_entry(entry_dir(key, cache_dir))
+        if entry is not None:
+            found.append(entry)
+    return found
+
+
+def evict(max_bytes=None, cache_dir=CACHE_DIR, verbose=True):
+    """Drop least recently used entries until the cache fits in ``max_bytes``."""
+    if max_bytes is None:
+        max_bytes = max_cache_bytes()
+    cached = sorted(entries(cache_dir), key=lambda entry: entry["last_used"])
+    total = sum(entry["size"] for entry in cached)
+    for entry in cached:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir(entry["key"], cache_dir), ignore_errors=True)
+        total -= entry["size"]
+        if verbose:
+            print(f"Evicted cached {entry['description'] or entry['key']}")
+    return total
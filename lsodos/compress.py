@@ -0,0 +1,141 @@
+"""Optional compression of the wide DOS matrices before UMAP.
+
+The full-range histograms have ~16,700 bins per channel, so a stacked
+combination of six to eight channels has ~100k (sparse) columns and the kNN
+search UMAP starts with works in that many dimensions. ``compress`` maps a
+scaled matrix to far fewer columns first:
+
+``svd``
+    ``TruncatedSVD`` (randomized) straight on the sparse matrix, to
+    ``n_components`` dense columns.
+``rebin``
+    Adjacent bins summed in blocks of ``factor`` within each channel (never
+    across channels) and divided by the square root of the block size, which
+    is the orthogonal projection onto block-constant spectra. Stays sparse.
+
+Both report how much of the original geometry survives:
+
+``retained_variance``
+    Total column variance of the compressed matrix over that of the input.
+    Both methods are orthogonal projections, so this is at most 1.
+``neighbour_preservation``
+    For a sample of rows, the fraction of each row's ``n_neighbors`` nearest
+    rows (with the UMAP metric) in the input that are still among its
+    ``n_neighbors`` nearest in the compressed matrix, averaged. 1 means UMAP
+    builds its graph from the same neighbourhoods.
+
+The compressed matrix then goes through ``lsodos.knn`` like any other, so its
+graph is cached under its own hash.
+"""
+import json
+
+import numpy as np
+from scipy import sparse
+
+from lsodos.datasets import dataset_paths, load_energy_axis
+
+SVD = "svd"
+REBIN = "rebin"
+METHODS = (SVD, REBIN)
+N_COMPONENTS = 256
+REBIN_FACTOR = 64
+SCORE_SAMPLE = 1000
+
+
+def channel_widths(paths):
+    """Column count of each channel of the datasets stacked by ``load_aligned_datasets(paths)``."""
+    widths = []
+    for path in paths:
+        n_bins = len(load_energy_axis(path))
+        try:
+            with open(dataset_paths(path)["meta"], "r") as f:
+                n_channels = len(json.load(f).get("channels") or [None])
+        except OSError:
+            n_channels = 1
+        widths.extend([n_bins] * n_channels)
+    return widths
+
+
+def rebin_matrix(widths, factor):
+    """Sparse ``(sum(widths), n_blocks)`` projection summing ``factor`` adjacent columns per channel."""
+    rows, cols, values = [], [], []
+    n_blocks = 0
+    start = 0
+    for width in widths:
+        column = np.arange(width)
+        block = column // factor
+        sizes = np.bincount(block)
+        rows.append(start + column)
+        cols.append(n_blocks + block)
+        values.append(1.0 / np.sqrt(sizes[block]))
+        n_blocks += len(sizes)
+        start += width
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(start, n_blocks))
+
+
+def total_variance(X):
+    """Sum of the column variances of a dense or sparse matrix."""
+    if sparse.issparse(X):
+        mean = np.asarray(X.mean(axis=0)).ravel()
+        mean_square = np.asarray(X.multiply(X).mean(axis=0)).ravel()
+        return float(np.sum(mean_square - mean ** 2))
+    return float(np.sum(np.var(X, axis=0)))
+
+
+def neighbour_preservation(X, Z, n_neighbors=15, metric="euclidean", n_sample=SCORE_SAMPLE, random_state=42):
+    """Mean fraction of sampled rows' kNN in ``X`` that are kNN in ``Z`` too (itself excluded)."""
+    from sklearn.metrics import pairwise_distances
+
+    n_rows = X.shape[0]
+    k = min(n_neighbors, n_rows - 1)
+    if k < 1:
+        return 1.0
+    rng = np.random.default_rng(random_state)
+    sample = np.sort(rng.choice(n_rows, size=min(n_sample, n_rows), replace=False))
+
+    def neighbours(M):
+        distances = pairwise_distances(M[sample], M, metric=metric)
+        distances[np.arange(len(sample)), sample] = np.inf
+        return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+    before, after = neighbours(X), neighbours(Z)
+    return float(np.mean([len(np.intersect1d(b, a)) / k for b, a in zip(before, after)]))
+
+
+def compress(X, method=SVD, n_components=N_COMPONENTS, factor=REBIN_FACTOR, widths=None, n_neighbors=15,
+             metric="euclidean", random_state=42, verbose=True):
+    """Compress a (scaled) matrix; returns ``(Z, report)``.
+
+    ``widths`` are the channel widths for ``rebin`` (see ``channel_widths``);
+    without them the whole row is one channel. ``report`` holds the method,
+    the input and output column counts and the two scores of the module
+    docstring, computed with ``n_neighbors`` and ``metric``.
+    """
+    if method == SVD:
+        from sklearn.decomposition import TruncatedSVD
+
+        n_components = min(n_components, min(X.shape) - 1)
+        Z = TruncatedSVD(n_components=n_components, algorithm="randomized",
+                         random_state=random_state).fit_transform(X).astype(np.float32)
+    elif method == REBIN:
+        widths = widths or [X.shape[1]]
+        if sum(widths) != X.shape[1]:
+            raise ValueError(f"channel widths add up to {sum(widths)} columns, the matrix has {X.shape[1]}")
+        Z = sparse.csr_matrix(X) @ rebin_matrix(widths, factor)
+        Z = Z.astype(np.float32)
+    else:
+        raise ValueError(f"unknown compression {method!r}, expected one of {METHODS}")
+
+    report = {
+        "method": method,
+        "columns": X.shape[1],
+        "compressed_columns": Z.shape[1],
+        "retained_variance": total_variance(Z) / (total_variance(X) or 1.0),
+        "neighbour_preservation": neighbour_preservation(X, Z, n_neighbors, metric, random_state=random_state),
+    }
+    if verbose:
+        print(f"Compressed {report['columns']} columns to {report['compressed_columns']} ({method}): "
+              f"{report['retained_variance']:.1%} of the variance, "
+              f"{report['neighbour_preservation']:.1%} of {n_neighbors}-NN ({metric}) kept")
+    return Z, report
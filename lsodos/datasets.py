@@ -0,0 +1,556 @@
+"""Readers and writers for the wide per-material datasets in datasets/output.
+
+A dataset ``name`` can exist as a dense ``name.csv`` (one ``material`` column
+plus one column per bin) and as a sparse ``name.npz`` (scipy CSR, one row per
+material) with a ``name.meta.json`` sidecar holding the material names, the
+bin centers and the channel labels. Most DOS bins are zero, so the sparse
+form is far smaller and loads straight into the matrix UMAP needs.
+
+The energy axis is kept losslessly in ``name.axis.npz`` (the exact bin centers,
+and the bin edges for histograms), with an ``emin``/``dE``/``nbins`` summary in
+the sidecar (plus the runs of equal spacing for grids whose spacing varies),
+so loaders never have to parse the rounded ``E=...eV`` headers.
+
+Every CSV also gets a ``name.rows.json`` row index that maps each material to
+the byte offset and length of its line. Quick-look plots use it to read only
+the rows they need.
+
+Datasets built by ``lsodos.pipeline`` also get a ``name.sources.json``
+listing the corpus files (mtime, size, material) their rows came from, which
+is what lets the pipeline update them incrementally.
+
+The CSV is always the float64 reference. The .npz can be stored at a lower
+precision (``dtype``, default from $LSODOS_DTYPE, else float64):
+
+``float32``
+    Each value rounded to float32: ``|x' - x| <= 2**-24 * |x|`` (about
+    6e-8 relative), half the disk and memory of float64.
+``float16``
+    Each row divided by its largest absolute value ``m`` (kept in
+    ``name.scale.npy``) and rounded to float16, so nothing overflows:
+    ``|x' - x| <= 2**-11 * |x| + 2**-25 * m`` (about 4.9e-4 relative, plus
+    3e-8 of the row maximum for values that fall below float16's normal
+    range). A quarter of the size of float64; loaded back as float32.
+
+``load_dataset`` returns float32 matrices for both, which is what UMAP works
+in anyway, and only converts further when asked for a ``dtype``.
+"""
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+CHUNK_ROWS = 64
+DEFAULT_FORMATS = ("csv", "npz")
+DTYPE_ENV = "LSODOS_DTYPE"
+DTYPES = ("float64", "float32", "float16")
+
+
+def energy_columns(bin_centers):
+    return [f"E={e:.3f}eV" for e in bin_centers]
+
+
+def parse_energy_columns(columns):
+    """Energies from ``E=...eV`` headers, for datasets without a saved axis."""
+    return np.array([float(c.rsplit("E=", 1)[1][:-len("eV")]) for c in columns])
+
+
+def axis_descriptor(bin_centers, bin_edges=None):
+    """Summary of an energy axis for the sidecar.
+
+    Axes with varying spacing also get ``steps``: ``[start, dE, n]`` for each
+    run of equal spacings (of the bin edges when given, else of the centers).
+    """
+    bin_centers = np.asarray(bin_centers, dtype=float)
+    steps = np.diff(bin_centers)
+    dE = float(steps.mean()) if len(steps) else 0.0
+    descriptor = {
+        "emin": float(bin_centers[0]) if len(bin_centers) else None,
+        "dE": dE,
+        "nbins": len(bin_centers),
+        "uniform": bool(np.allclose(steps, dE, rtol=1e-6, atol=0.0)),
+    }
+    if not descriptor["uniform"]:
+        points = bin_centers if bin_edges is None else np.asarray(bin_edges, dtype=float)
+        widths = np.diff(points)
+        new_run = np.concatenate(([True], ~np.isclose(widths[1:], widths[:-1], rtol=1e-6, atol=0.0)))
+        starts = np.flatnonzero(new_run)
+        counts = np.diff(np.append(starts, len(widths)))
+        descriptor["steps"] = [[float(points[i]), float(widths[i]), int(n)] for i, n in zip(starts, counts)]
+    return descriptor
+
+
+def save_energy_axis(out_file, bin_centers, bin_edges=None):
+    axis = {"centers": np.asarray(bin_centers, dtype=float)}
+    if bin_edges is not None:
+        axis["edges"] = np.asarray(bin_edges, dtype=float)
+    with open(dataset_paths(out_file)["axis"], "wb") as f:
+        np.savez(f, **axis)
+
+
+def load_energy_axis(path, edges=False):
+    """Return the exact bin centers of a dataset (or its edges, for histograms).
+
+    Falls back to parsing the CSV header when the dataset predates the saved
+    axis; that gives centers rounded to the header's three decimals and no
+    edges. For multi-channel datasets this is the axis of one channel.
+    """
+    paths = dataset_paths(path)
+    if os.path.exists(paths["axis"]):
+        with np.load(paths["axis"]) as axis:
+            if edges:
+                return axis["edges"] if "edges" in axis.files else None
+            return axis["centers"]
+    if edges:
+        return None
+    with open(paths["csv"], "r") as f:
+        columns = f.readline().rstrip("\r\n").split(",")[1:]
+    channel = columns[0].rsplit("E=", 1)[0]
+    return parse_energy_columns([c for c in columns if c.rsplit("E=", 1)[0] == channel])
+
+
+def channel_columns(bin_centers, channels=None):
+    columns = energy_columns(bin_centers)
+    if not channels:
+        return columns
+    return [f"{channel}_{column}" for channel in channels for column in columns]
+
+
+def dataset_paths(out_file):
+    base, _ = os.path.splitext(out_file)
+    return {"csv": base + ".csv", "npz": base + ".npz", "meta": base + ".meta.json",
+            "rows": base + ".rows.json", "axis": base + ".axis.npz", "sources": base + ".sources.json",
+            "scale": base + ".scale.npy"}
+
+
+def default_dtype():
+    """Storage dtype from $LSODOS_DTYPE, else float64."""
+    return check_dtype(os.environ.get(DTYPE_ENV) or "float64")
+
+
+def check_dtype(dtype):
+    dtype = np.dtype(dtype).name
+    if dtype not in DTYPES:
+        raise ValueError(f"unsupported dataset dtype {dtype!r}, expected one of {DTYPES}")
+    return dtype
+
+
+class CsvDatasetWriter:
+    """Append ``material, values...`` rows to a CSV in small chunks.
+
+    The chunks go through ``DataFrame.to_csv`` so the file is byte-identical to
+    building the whole frame and writing it once, but only ``chunk_rows`` rows
+    are held in memory at a time. The byte offset of every row is recorded on
+    the way and saved as the row index when the file is closed.
+
+    ``columns`` can be None when the header is only known at the end (as for
+    grids that depend on the last material); rows are then spooled to a
+    temporary file and the header is put in front of them by ``close``.
+
+    Rows go to ``out_file + ".tmp"``, which replaces ``out_file`` only on
+    ``close``; ``abort`` drops it and leaves an existing file untouched.
+    """
+
+    def __init__(self, out_file, columns, chunk_rows=CHUNK_ROWS):
+        self.out_file = out_file
+        self.columns = None if columns is None else ["material"] + list(columns)
+        self.chunk_rows = chunk_rows
+        self.n_rows = 0
+        self._pending = []
+        self._header_written = False
+        self._offset = 0
+        self.header = None
+        self.row_offsets = {}
+        os.makedirs(os.path.dirname(out_file) or ".", exist_ok=True)
+        self._tmp_file = out_file + ".tmp"
+        self._fh = open(self._tmp_file if self.columns is not None else out_file + ".rows.tmp", "w", newline="")
+
+    def append(self, material, values):
+        self._pending.append([material, *values])
+        if len(self._pending) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending and (self._header_written or self.columns is None):
+            return
+        write_header = self.columns is not None and not self._header_written
+        df = pd.DataFrame(self._pending, columns=self.columns)
+        text = df.to_csv(index=False, header=write_header)
+        lines = text.split("\n")[:-1]
+        if write_header:
+            self.header = [self._offset, len(lines[0].encode()) + 1]
+            self._offset += self.header[1]
+            lines = lines[1:]
+            self._header_written = True
+        for row, line in zip(self._pending, lines):
+            length = len(line.encode()) + 1
+            self.row_offsets.setdefault(row[0], [self._offset, length])
+            self._offset += length
+        self._fh.write(text)
+        self.n_rows += len(self._pending)
+        self._pending = []
+
+    def close(self, columns=None):
+        """Finish the file; ``columns`` is required if none were given up front."""
+        if self._fh is None:
+            return
+        self._flush()
+        self._fh.close()
+        if self.columns is None:
+            self._write_deferred_header(["material"] + list(columns))
+        self._fh = None
+        os.replace(self._tmp_file, self.out_file)
+        save_row_index(self.out_file, {"header": self.header, "rows": self.row_offsets})
+
+    def abort(self):
+        """Discard the rows written so far."""
+        if self._fh is None:
+            return
+        self._fh.close()
+        os.remove(self._fh.name)
+        self._fh = None
+
+    def _write_deferred_header(self, columns):
+        body_file = self._fh.name
+        header = pd.DataFrame(columns=columns).to_csv(index=False)
+        header_length = len(header.encode())
+        with open(self._tmp_file, "w", newline="") as out, open(body_file, "r", newline="") as body:
+            out.write(header)
+            shutil.copyfileobj(body, out)
+        os.remove(body_file)
+        self.columns = columns
+        self.header = [0, header_length]
+        self.row_offsets = {m: [offset + header_length, length] for m, (offset, length) in self.row_offsets.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SparseDatasetWriter:
+    """Collect rows as CSR pieces (only the non-zeros) and save them as .npz.
+
+    The non-zeros are spooled to temporary files next to ``out_file`` and only
+    mapped back in when the matrix is saved, so memory use does not grow with
+    the number of rows. ``dtype`` is the storage precision (see above).
+    """
+
+    def __init__(self, out_file, n_columns, dtype="float64"):
+        self.out_file = out_file
+        self.n_columns = n_columns
+        self.dtype = check_dtype(dtype)
+        self._indptr = [0]
+        self._scales = []
+        os.makedirs(os.path.dirname(out_file) or ".", exist_ok=True)
+        self._spool = {name: open(f"{out_file}.{name}.tmp", "wb") for name in ("indices", "data")}
+
+    def append(self, values):
+        values = np.asarray(values, dtype=float)
+        nonzero = np.flatnonzero(values)
+        data = values[nonzero]
+        if self.dtype == "float16":
+            scale = float(np.abs(data).max()) if len(data) else 1.0
+            self._scales.append(scale)
+            data = data / scale
+        nonzero.astype(np.int32).tofile(self._spool["indices"])
+        data.astype(self.dtype).tofile(self._spool["data"])
+        self._indptr.append(self._indptr[-1] + len(nonzero))
+
+    def _mapped(self, name, dtype):
+        self._spool[name].close()
+        if self._indptr[-1] == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self._spool[name].name, dtype=dtype, mode="r")
+
+    def close(self):
+        n_rows = len(self._indptr) - 1
+        indices = self._mapped("indices", np.int32)
+        data = self._mapped("data", self.dtype)
+        matrix = sparse.csr_matrix((data, indices, np.array(self._indptr, dtype=np.int64)),
+                                   shape=(n_rows, self.n_columns), copy=False)
+        tmp_file = self.out_file + ".tmp.npz"
+        sparse.save_npz(tmp_file, matrix)
+        if self.dtype == "float16":
+            np.save(dataset_paths(self.out_file)["scale"], np.array(self._scales))
+        os.replace(tmp_file, self.out_file)
+        del matrix, indices, data
+        for fh in self._spool.values():
+            os.remove(fh.name)
+
+    def abort(self):
+        """Discard the rows written so far."""
+        for fh in self._spool.values():
+            fh.close()
+            os.remove(fh.name)
+
+
+class DatasetWriter:
+    """Write one dataset in every requested format while rows stream in.
+
+    ``out_file`` is the CSV path the generators have always used; the sparse
+    matrix, the sidecar and the energy axis are written next to it. Pass
+    ``bin_edges`` for histograms so the axis keeps them too. Nothing replaces
+    the files of an earlier build before ``close``; ``abort`` (or an exception
+    inside a ``with`` block) leaves them as they were.
+    """
+
+    def __init__(self, out_file, bin_centers, channels=None, formats=DEFAULT_FORMATS, bin_edges=None, dtype=None):
+        self.paths = dataset_paths(out_file)
+        self.dtype = default_dtype() if dtype is None else check_dtype(dtype)
+        self.bin_centers = np.asarray(bin_centers)
+        self.bin_edges = bin_edges
+        self.channels = list(channels) if channels else None
+        self.formats = tuple(formats)
+        self.materials = []
+        self._closed = False
+        columns = channel_columns(self.bin_centers, self.channels)
+        self._csv = CsvDatasetWriter(self.paths["csv"], columns) if "csv" in self.formats else None
+        self._npz = (SparseDatasetWriter(self.paths["npz"], len(columns), dtype=self.dtype)
+                     if "npz" in self.formats else None)
+
+    def append(self, material, values):
+        self.materials.append(material)
+        if self._csv is not None:
+            self._csv.append(material, values.tolist() if isinstance(values, np.ndarray) else values)
+        if self._npz is not None:
+            self._npz.append(values)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        save_energy_axis(self.paths["csv"], self.bin_centers, self.bin_edges)
+        if self._csv is not None:
+            self._csv.close()
+            self._csv = None
+        if self._npz is not None:
+            self._npz.close()
+            self._npz = None
+            meta = {
+                "materials": self.materials,
+                "axis": axis_descriptor(self.bin_centers, self.bin_edges),
+                "channels": self.channels,
+                "dtype": self.dtype,
+            }
+            with open(self.paths["meta"], "w") as f:
+                json.dump(meta, f)
+
+        # loaders prefer the .npz, so files of a format this build does not
+        # write must not be left over from an earlier build
+        stale = []
+        if "npz" not in self.formats:
+            stale += ["npz", "meta", "scale"]
+        elif self.dtype != "float16":
+            stale.append("scale")
+        if "csv" not in self.formats:
+            stale += ["csv", "rows"]
+        for kind in stale:
+            if os.path.exists(self.paths[kind]):
+                os.remove(self.paths[kind])
+
+    def abort(self):
+        """Drop the rows written so far without touching the existing files."""
+        if self._closed:
+            return
+        self._closed = True
+        for writer in (self._csv, self._npz):
+            if writer is not None:
+                writer.abort()
+        self._csv = self._npz = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def load_dataset(path, dtype=None):
+    """Load a dataset as ``(materials, csr_matrix, meta)``.
+
+    Uses the sparse .npz and its sidecar when present and only falls back to
+    reading the dense CSV for datasets written before those existed. The
+    matrix keeps the stored precision (float16 comes back as float32) unless
+    ``dtype`` asks for another one.
+    """
+    paths = dataset_paths(path)
+    if not (os.path.exists(paths["npz"]) and os.path.exists(paths["meta"])):
+        return load_csv_dataset(path, dtype=dtype)
+
+    with open(paths["meta"], "r") as f:
+        meta = json.load(f)
+    matrix = sparse.load_npz(paths["npz"]).tocsr()
+    if matrix.dtype == np.float16:
+        scales = np.load(paths["scale"]).astype(np.float32)
+        data = matrix.data.astype(np.float32) * np.repeat(scales, np.diff(matrix.indptr))
+        matrix = sparse.csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape)
+    if dtype is not None:
+        matrix = matrix.astype(dtype)
+    return np.array(meta["materials"], dtype=object), matrix, meta
+
+
+def load_csv_dataset(path, dtype=None):
+    """Load the float64 CSV of a dataset as ``(materials, csr_matrix, meta)``."""
+    df = pd.read_csv(dataset_paths(path)["csv"], float_precision="round_trip")
+    materials = df["material"].to_numpy(dtype=object)
+    matrix = sparse.csr_matrix(df.drop(columns=["material"]).to_numpy(dtype=dtype or float))
+    meta = {"materials": materials.tolist(), "columns": list(df.columns[1:])}
+    return materials, matrix, meta
+
+
+def load_materials(path):
+    """Material names of a dataset in row order, without loading its values."""
+    paths = dataset_paths(path)
+    if os.path.exists(paths["npz"]) and os.path.exists(paths["meta"]):
+        with open(paths["meta"], "r") as f:
+            return np.array(json.load(f)["materials"], dtype=object)
+    return np.array(dataset_materials(paths["csv"]), dtype=object)
+
+
+def _row_nnz(path, rows):
+    # only the indptr member of the .npz is read
+    with np.load(dataset_paths(path)["npz"]) as npz:
+        return np.diff(npz["indptr"])[rows]
+
+
+def _result_dtype(paths, dtype):
+    if dtype is not None:
+        return np.dtype(dtype)
+    dtypes = []
+    for path in paths:
+        meta_file = dataset_paths(path)["meta"]
+        stored = "float64"
+        if os.path.exists(dataset_paths(path)["npz"]) and os.path.exists(meta_file):
+            with open(meta_file, "r") as f:
+                stored = json.load(f).get("dtype", "float64")
+        dtypes.append(np.float32 if stored == "float16" else np.dtype(stored))
+    return np.result_type(*dtypes)
+
+
+def load_aligned_datasets(paths, dtype=None):
+    """Load several datasets and stack their columns for the shared materials.
+
+    Rows follow the first dataset, keeping only materials present in all of
+    them, the same rows a chain of ``merge(on="material", how="inner")``
+    calls would keep. The rows are matched on the material lists alone and
+    the stacked CSR arrays are allocated up front from the row lengths; each
+    dataset is then loaded, copied into place and dropped, so peak memory is
+    the final matrix plus one dataset.
+    """
+    positions = [pd.Series(np.arange(len(names)), index=names) for names in map(load_materials, paths)]
+    materials = positions[0].index.to_numpy(dtype=object)
+    for position in positions[1:]:
+        materials = materials[pd.Index(materials).isin(position.index)]
+    rows = [position.loc[materials].to_numpy() for position in positions]
+
+    nnz = []
+    for path, block_rows in zip(paths, rows):
+        if os.path.exists(dataset_paths(path)["npz"]) and os.path.exists(dataset_paths(path)["meta"]):
+            nnz.append(_row_nnz(path, block_rows))
+        else:
+            nnz.append(load_dataset(path)[1][block_rows].getnnz(axis=1))
+    indptr = np.zeros(len(materials) + 1, dtype=np.int64)
+    np.cumsum(np.sum(nnz, axis=0), out=indptr[1:])
+    data = np.empty(indptr[-1], dtype=_result_dtype(paths, dtype))
+    indices = np.empty(indptr[-1], dtype=np.int64 if indptr[-1] > np.iinfo(np.int32).max else np.int32)
+
+    start = indptr[:-1].copy()
+    n_columns = 0
+    for path, block_rows, block_nnz in zip(paths, rows, nnz):
+        block = load_dataset(path)[1][block_rows]
+        row_of = np.repeat(np.arange(len(materials)), block_nnz)
+        dest = start[row_of] + np.arange(block.nnz) - block.indptr[row_of]
+        data[dest] = block.data
+        indices[dest] = block.indices + n_columns
+        start += block_nnz
+        n_columns += block.shape[1]
+        del block, row_of, dest
+    return materials, sparse.csr_matrix((data, indices, indptr), shape=(len(materials), n_columns))
+
+
+def join_properties(materials, matrix, properties_df, on="material"):
+    """Inner-join a per-material property table onto a dataset's rows.
+
+    Gives the same rows, in the same order, as merging the dense dataset with
+    ``properties_df`` on ``material``; the property columns come back as a
+    separate frame instead of ending up next to the features.
+    """
+    rows = pd.DataFrame({on: materials, "_row": np.arange(len(materials))})
+    properties = rows.merge(properties_df, on=on, how="inner")
+    keep = properties.pop("_row").to_numpy()
+    return materials[keep], matrix[keep], properties
+
+
+def save_row_index(csv_file, row_index):
+    st = os.stat(csv_file)
+    row_index = dict(row_index, mtime_ns=st.st_mtime_ns, size=st.st_size)
+    path = dataset_paths(csv_file)["rows"]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(row_index, f)
+    os.replace(tmp_path, path)
+
+
+def scan_row_index(csv_file):
+    """Build the row index of an existing CSV by walking its lines once.
+
+    Only the leading ``material`` field of each line is looked at, so this is
+    much cheaper than parsing the table.
+    """
+    row_index = {"header": None, "rows": {}}
+    offset = 0
+    with open(csv_file, "rb") as f:
+        for line in f:
+            if row_index["header"] is None:
+                row_index["header"] = [offset, len(line)]
+            else:
+                material = line.split(b",", 1)[0].decode().strip('"')
+                row_index["rows"].setdefault(material, [offset, len(line)])
+            offset += len(line)
+    return row_index
+
+
+def load_row_index(csv_file):
+    """Return the row index of ``csv_file``, rebuilding it if the CSV changed."""
+    path = dataset_paths(csv_file)["rows"]
+    st = os.stat(csv_file)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            row_index = json.load(f)
+        if row_index.get("mtime_ns") == st.st_mtime_ns and row_index.get("size") == st.st_size:
+            return row_index
+    row_index = scan_row_index(csv_file)
+    save_row_index(csv_file, row_index)
+    return row_index
+
+
+def dataset_materials(csv_file):
+    return list(load_row_index(csv_file)["rows"])
+
+
+def read_rows(csv_file, materials):
+    """Read the rows of ``materials`` from a dataset CSV without scanning it.
+
+    Returns a frame with the CSV's columns and one row per material found, in
+    the order asked for; materials not in the dataset are left out.
+    """
+    row_index = load_row_index(csv_file)
+    spans = [row_index["header"]] + [row_index["rows"][m] for m in materials if m in row_index["rows"]]
+    chunks = []
+    with open(csv_file, "rb") as f:
+        for offset, length in spans:
+            f.seek(offset)
+            chunks.append(f.read(length))
+    return pd.read_csv(io.BytesIO(b"".join(chunks)))
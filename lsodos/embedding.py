@@ -0,0 +1,133 @@
+"""UMAP embeddings of the datasets, stored as artifacts the plots render from.
+
+``embedding_for`` scales a dataset with ``MaxAbsScaler``, fits UMAP on it (with
+the kNN graph from ``lsodos.knn``) and saves the 2D coordinates in
+``datasets/output/embeddings/<dataset>_<params>.npz`` together with the
+material ids, the UMAP parameters, a hash of the input matrix and the
+mtime/size of the files it was computed from. Later calls with the same
+parameters load the artifact instead of refitting, as long as those files are
+unchanged, so every colouring of one embedding renders in seconds.
+
+``properties_file`` restricts the fit to the materials in that table (the
+plots only show materials with a known bandgap), as ``join_properties`` does.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from lsodos.datasets import dataset_paths, join_properties, load_dataset
+from lsodos.knn import matrix_hash, precomputed_knn
+
+EMBEDDING_DIR = os.path.join("datasets", "output", "embeddings")
+
+
+def embedding_params(n_neighbors=15, metric="euclidean", densmap=False, random_state=42, properties_file=None,
+                     min_dist=0.1):
+    return {
+        "n_neighbors": n_neighbors,
+        "metric": metric,
+        "min_dist": min_dist,
+        "densmap": densmap,
+        "random_state": random_state,
+        "scaler": "maxabs",
+        "properties_file": properties_file,
+    }
+
+
+def embedding_path(dataset_file, params, embedding_dir=EMBEDDING_DIR):
+    name = os.path.splitext(os.path.basename(dataset_file))[0]
+    tag = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(embedding_dir, f"{name}_{params['n_neighbors']}_{params['metric']}_{tag}.npz")
+
+
+def source_stats(dataset_file, properties_file=None):
+    """mtime and size of the files an embedding is computed from."""
+    paths = dataset_paths(dataset_file)
+    files = [paths["npz"] if os.path.exists(paths["npz"]) else paths["csv"]]
+    if properties_file is not None:
+        files.append(properties_file)
+    stats = {}
+    for path in files:
+        st = os.stat(path)
+        stats[path] = [st.st_mtime_ns, st.st_size]
+    return stats
+
+
+def scale(X):
+    from sklearn.preprocessing import MaxAbsScaler
+
+    return MaxAbsScaler().fit_transform(X)
+
+
+def fit_scaled(X_scaled, params, knn=None):
+    """Fit UMAP with ``params`` on an already scaled matrix; returns the 2D coordinates."""
+    import umap
+
+    if knn is None:
+        knn = precomputed_knn(X_scaled, params["n_neighbors"], params["metric"], random_state=params["random_state"])
+    reducer = umap.UMAP(n_neighbors=params["n_neighbors"], metric=params["metric"], min_dist=params["min_dist"],
+                        random_state=params["random_state"], densmap=params["densmap"], precomputed_knn=knn)
+    return reducer.fit_transform(X_scaled)
+
+
+def fit_embedding(X, params):
+    """Scale ``X`` and fit UMAP with ``params``; returns the 2D coordinates."""
+    return fit_scaled(scale(X), params)
+
+
+def save_embedding(path, materials, coordinates, params, input_hash, sources):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, materials=np.asarray(materials, dtype=str), embedding=coordinates,
+             info=np.array(json.dumps({"params": params, "input_hash": input_hash, "sources": sources})))
+    os.replace(tmp_path, path)
+
+
+def load_embedding(path):
+    """An embedding artifact as a dict with materials, embedding, params, input_hash and sources."""
+    with np.load(path) as artifact:
+        embedding = dict(json.loads(str(artifact["info"])))
+        embedding["materials"] = artifact["materials"].astype(object)
+        embedding["embedding"] = artifact["embedding"]
+    return embedding
+
+
+def is_current(path, params, sources):
+    if not os.path.exists(path):
+        return False
+    embedding = load_embedding(path)
+    return embedding["params"] == params and embedding["sources"] == sources
+
+
+def load_for_embedding(dataset_file, properties_file=None):
+    """Materials and matrix of a dataset, restricted to ``properties_file`` materials."""
+    materials, X, _ = load_dataset(dataset_file)
+    if properties_file is not None:
+        materials, X, _ = join_properties(materials, X, pd.read_csv(properties_file))
+    return materials, X
+
+
+def embedding_for(dataset_file, n_neighbors=15, metric="euclidean", densmap=False, random_state=42,
+                  properties_file=None, min_dist=0.1, embedding_dir=EMBEDDING_DIR, verbose=True):
+    """The stored embedding of a dataset, fitting and saving it first if needed."""
+    params = embedding_params(n_neighbors, metric, densmap, random_state, properties_file, min_dist)
+    path = embedding_path(dataset_file, params, embedding_dir)
+    sources = source_stats(dataset_file, properties_file)
+    if is_current(path, params, sources):
+        if verbose:
+            print(f"Loaded embedding from {path}")
+        return load_embedding(path)
+
+    materials, X = load_for_embedding(dataset_file, properties_file)
+    if verbose:
+        print("started UMAP")
+    coordinates = fit_embedding(X, params)
+    if verbose:
+        print("finished UMAP")
+    save_embedding(path, materials, coordinates, params, matrix_hash(X), sources)
+    if verbose:
+        print(f"Saved embedding to {path}")
+    return load_embedding(path)
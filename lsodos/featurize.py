@@ -0,0 +1,82 @@
+"""Per-material featurization shared by the dataset generators.
+
+A channel is a ``(group, spin)`` pair. ``group`` is ``"tdos"`` or a tuple of
+per-site keys whose histograms are summed; ``spin`` is ``"1"``, ``"-1"`` or
+``"both"`` (up + down densities added before binning).
+"""
+import numpy as np
+
+from lsodos.binning import histogram_batch
+from lsodos.resample import NEAREST, resample_batch
+
+TDOS = "tdos"
+BOTH_SPINS = "both"
+
+
+def channel_sites(channels):
+    """The per-site keys a list of channels needs loaded."""
+    return sorted({site for group, _ in channels if group != TDOS for site in group}, key=int)
+
+
+def _weights(block, spin):
+    if spin == BOTH_SPINS:
+        return block["densities"]["1"] + block["densities"]["-1"]
+    return block["densities"][spin]
+
+
+def _channel_blocks(record, channel):
+    group, spin = channel
+    if group == TDOS:
+        blocks = [record["tdos"]]
+    else:
+        blocks = [record["tdos_per_site"][site] for site in group]
+    return [(block["energies"], _weights(block, spin)) for block in blocks]
+
+
+def histogram_channels(record, channels, bin_edges):
+    """Histograms of several channels of one material from one batched call.
+
+    Site groups are the sum of their per-site histograms, added in site order.
+    """
+    blocks = [_channel_blocks(record, channel) for channel in channels]
+    flat = [block for channel_blocks in blocks for block in channel_blocks]
+    rows = histogram_batch([e for e, _ in flat], [w for _, w in flat], bin_edges)
+
+    hists = []
+    i = 0
+    for channel, channel_blocks in zip(channels, blocks):
+        if channel[0] == TDOS:
+            hists.append(rows[i])
+        else:
+            total = np.zeros(len(bin_edges) - 1)
+            for row in rows[i:i + len(channel_blocks)]:
+                total += row
+            hists.append(total)
+        i += len(channel_blocks)
+    return hists
+
+
+def resample_channels(record, channels, grid, kind=NEAREST):
+    """Resampling of several channels of one material onto ``grid`` points.
+
+    All blocks go through one ``resample_batch`` call, so blocks on the same
+    energy axis share their searchsorted plan. Points outside a block's energy
+    range are zero; site groups are summed after resampling.
+    """
+    blocks = [_channel_blocks(record, channel) for channel in channels]
+    flat = [block for channel_blocks in blocks for block in channel_blocks]
+    rows = resample_batch([e for e, _ in flat], [w for _, w in flat], grid, kind=kind)
+
+    values = []
+    i = 0
+    for channel, channel_blocks in zip(channels, blocks):
+        if channel[0] == TDOS:
+            values.append(rows[i])
+        else:
+            total = np.zeros(len(grid))
+            for row in rows[i:i + len(channel_blocks)]:
+                total += row
+            values.append(total)
+        i += len(channel_blocks)
+    return values
+
@@ -0,0 +1,73 @@
+"""Parse the DOS JSON files into numpy arrays, one material at a time."""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+SPINS = ["1", "-1"]
+PERSITE_SUFFIX = "_persite"
+
+
+def list_json_files(folder):
+    return [f for f in os.listdir(folder) if f.endswith(".json")]
+
+
+def material_name(fname):
+    stem = Path(fname).stem
+    if stem.endswith(PERSITE_SUFFIX):
+        stem = stem[:-len(PERSITE_SUFFIX)]
+    return stem
+
+
+def _parse_block(block):
+    parsed = {
+        "energies": np.array(block["energies"], dtype=float),
+        "densities": {spin: np.array(block["densities"][spin], dtype=float) for spin in SPINS},
+    }
+    if "efermi" in block:
+        parsed["efermi"] = float(block["efermi"])
+    return parsed
+
+
+def read_dos_file(fpath, sites=None):
+    """Parse one DOS JSON into numpy arrays.
+
+    ``sites`` selects which ``tdos_per_site`` entries to keep (all of them when
+    None); ``has_b2`` records whether site "9" is present so callers can skip
+    vacancy-ordered materials without keeping every site in memory.
+    """
+    with open(fpath, "r") as f:
+        data = json.load(f)
+
+    record = {"material": material_name(fpath), "fname": os.path.basename(fpath)}
+    record["tdos"] = _parse_block(data["tdos"])
+
+    if "tdos_per_site" in data:
+        per_site = data["tdos_per_site"]
+        keys = per_site.keys() if sites is None else [str(s) for s in sites if str(s) in per_site]
+        record["tdos_per_site"] = {k: _parse_block(per_site[k]) for k in keys}
+        record["has_b2"] = "9" in per_site
+    else:
+        record["has_b2"] = False
+    return record
+
+
+def iter_corpus(folder, sites=None, use_store=True):
+    """Yield one record per material in ``folder``.
+
+    Reads from the binary store (see ``lsodos.store``) when one has been built
+    and still matches the files on disk, and falls back to parsing the JSON.
+    """
+    if use_store:
+        # store.py builds on this module, so import it lazily
+        from lsodos.store import iter_store_records, open_store, store_is_fresh
+
+        store = open_store(folder)
+        if store is not None and store_is_fresh(store, folder):
+            yield from iter_store_records(store, sites=sites)
+            return
+
+    for fname in list_json_files(folder):
+        yield read_dos_file(os.path.join(folder, fname), sites=sites)
+
@@ -0,0 +1,95 @@
+"""On-disk cache of the k-nearest-neighbour graphs UMAP is fitted on.
+
+Building the kNN graph is most of a UMAP fit, and the UMAP scripts often refit
+the same (scaled) feature matrix with the same metric, changing only the
+colouring or ``densmap``. ``precomputed_knn`` returns the graph for a matrix,
+computing it once and keeping the indices and distances in
+``datasets/output/knn`` keyed on a hash of the matrix, the metric,
+``n_neighbors`` and the random state::
+
+    reducer = umap.UMAP(n_neighbors=15, metric="cosine", random_state=42,
+                        precomputed_knn=precomputed_knn(X_scaled, 15, "cosine", random_state=42))
+
+The graph is computed the way UMAP would: exact distances below
+``SMALL_DATA`` materials, nearest-neighbour descent above. The search index is
+not kept, so ``reducer.transform`` is unavailable on such fits. Fits on a
+precomputed graph are reproducible from run to run but not bit-identical to a
+fit that builds its own graph, since that build also draws from the random
+state.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+KNN_DIR = os.path.join("datasets", "output", "knn")
+SMALL_DATA = 4096
+KNN_VERSION = 1
+
+
+def matrix_hash(X):
+    """Hash of a dense or sparse matrix's shape, dtype and values."""
+    h = hashlib.sha256()
+    if sparse.issparse(X):
+        X = X.tocsr()
+        if not X.has_sorted_indices:
+            # tocsr() returns a CSR input itself; sort a copy, not the caller's matrix
+            X = X.sorted_indices()
+        arrays = (X.indptr, X.indices, X.data)
+    else:
+        arrays = (np.ascontiguousarray(X),)
+    h.update(json.dumps([list(X.shape), str(X.dtype), sparse.issparse(X)]).encode())
+    for array in arrays:
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()
+
+
+def knn_key(data_hash, n_neighbors, metric, random_state=None):
+    payload = {"version": KNN_VERSION, "data": data_hash, "n_neighbors": n_neighbors,
+               "metric": metric, "random_state": random_state}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def compute_knn(X, n_neighbors, metric="euclidean", random_state=None):
+    """``(indices, distances)`` of each row's ``n_neighbors`` nearest rows, itself first."""
+    from sklearn.metrics import pairwise_distances
+    from sklearn.utils import check_random_state
+    from umap.umap_ import nearest_neighbors
+
+    if X.shape[0] < SMALL_DATA:
+        distances = pairwise_distances(X, metric=metric)
+        indices = np.argsort(distances, axis=1, kind="stable")[:, :n_neighbors]
+        return indices, np.take_along_axis(distances, indices, axis=1).astype(np.float32)
+
+    indices, distances, _ = nearest_neighbors(
+        X, n_neighbors, metric, {}, False, check_random_state(random_state),
+        low_memory=True, use_pynndescent=True, n_jobs=1 if random_state is not None else -1,
+    )
+    return indices, distances
+
+
+def cached_knn(X, n_neighbors, metric="euclidean", random_state=None, cache_dir=KNN_DIR, verbose=True):
+    """``compute_knn`` through the on-disk cache."""
+    path = os.path.join(cache_dir, knn_key(matrix_hash(X), n_neighbors, metric, random_state) + ".npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if verbose:
+                print(f"Loaded {n_neighbors}-NN graph ({metric}) from {path}")
+            return cached["indices"], cached["distances"]
+
+    indices, distances = compute_knn(X, n_neighbors, metric, random_state)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, indices=indices, distances=distances)
+    os.replace(tmp_path, path)
+    if verbose:
+        print(f"Saved {n_neighbors}-NN graph ({metric}) to {path}")
+    return indices, distances
+
+
+def precomputed_knn(X, n_neighbors, metric="euclidean", random_state=None, cache_dir=KNN_DIR):
+    """The ``precomputed_knn`` argument of ``umap.UMAP`` for ``X``, from the cache."""
+    indices, distances = cached_knn(X, n_neighbors, metric, random_state, cache_dir)
+    return indices, distances, None
@@ -0,0 +1,83 @@
+"""Long-format (material, energy, tdos) dataset stored as Parquet.
+
+Each material goes into its own row group, and the file metadata maps material
+names to row-group numbers, so looking up one material reads only that
+material's rows instead of the whole file.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lsodos.ingest import iter_corpus
+
+LONG_DATASET = os.path.join("datasets", "output", "dos_dataset_long.parquet")
+MATERIALS_KEY = b"lsodos.materials"
+SCHEMA = pa.schema([("material", pa.string()), ("energy", pa.float64()), ("tdos", pa.float64())])
+
+
+def material_table(record):
+    tdos = record["tdos"]
+    energies = tdos["energies"]
+    dos = tdos["densities"]["1"] + tdos["densities"]["-1"]
+    return pa.table({
+        "material": pa.array(np.full(len(energies), record["material"], dtype=object), type=pa.string()),
+        "energy": energies,
+        "tdos": dos,
+    }, schema=SCHEMA)
+
+
+def write_long_dataset(folder, out_file=LONG_DATASET, use_store=True):
+    """Write the TDOS of every material in ``folder`` as one Parquet file.
+
+    Materials are streamed one at a time, so memory holds a single material's
+    arrays rather than the whole corpus. Returns the material names in file
+    order.
+    """
+    os.makedirs(os.path.dirname(out_file) or ".", exist_ok=True)
+    materials = []
+    tmp_file = out_file + ".tmp"
+    writer = None
+    try:
+        for record in iter_corpus(folder, sites=[], use_store=use_store):
+            table = material_table(record)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_file, SCHEMA)
+            writer.write_table(table, row_group_size=max(table.num_rows, 1))
+            materials.append(record["material"])
+        if writer is None:
+            writer = pq.ParquetWriter(tmp_file, SCHEMA)
+        writer.add_key_value_metadata({MATERIALS_KEY: json.dumps(materials).encode()})
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_file, out_file)
+    return materials
+
+
+class LongDataset:
+    """Random access by material to a file written by ``write_long_dataset``."""
+
+    def __init__(self, path=LONG_DATASET):
+        self.path = path
+        self._file = pq.ParquetFile(path)
+        metadata = self._file.metadata.metadata or {}
+        self.materials = json.loads(metadata[MATERIALS_KEY]) if MATERIALS_KEY in metadata else []
+        self._row_groups = {material: i for i, material in enumerate(self.materials)}
+
+    def __contains__(self, material):
+        return material in self._row_groups
+
+    def read(self, material):
+        """Return the ``energy`` and ``tdos`` columns for one material."""
+        if material not in self._row_groups:
+            return pd.DataFrame({"energy": [], "tdos": []})
+        table = self._file.read_row_group(self._row_groups[material], columns=["energy", "tdos"])
+        return table.to_pandas()
+
+
+def read_long_material(material, path=LONG_DATASET):
+    return LongDataset(path).read(material)
@@ -0,0 +1,177 @@
+"""On-disk index of per-file energy ranges, spacings and site information.
+
+The index lives in ``datasets/output/index`` and is keyed on each file's
+mtime and size, so only new or modified JSONs are summarized again (from the
+binary store of ``lsodos.store`` when it is up to date with them).
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from lsodos.ingest import list_json_files, read_dos_file
+
+INDEX_DIR = os.path.join("datasets", "output", "index")
+BAND_CSV = os.path.join("datasets", "data_luc", "CombinedHDPinfo_lsodos.csv")
+INDEX_VERSION = 1
+# The existing datasets were built from the spacing and band edges as printed
+# by Compute_all_spacings.py and calculate-max-bandgap.py, so those grid inputs
+# are rounded the same way; energy ranges were always taken from the files.
+PRINTED_DECIMALS = 5
+
+
+def index_path(folder):
+    name = os.path.basename(os.path.normpath(folder))
+    return os.path.join(INDEX_DIR, f"{name}_metadata.json")
+
+
+def file_key(fpath):
+    st = os.stat(fpath)
+    return st.st_mtime_ns, st.st_size
+
+
+def summarize_record(record):
+    tdos = record["tdos"]
+    energies = tdos["energies"]
+    entry = {
+        "material": record["material"],
+        "emin": float(energies.min()),
+        "emax": float(energies.max()),
+        "mean_spacing": float(np.mean(np.diff(energies))),
+        "efermi": tdos.get("efermi"),
+        "has_b2": record["has_b2"],
+        "sites": {},
+    }
+    for site_key, site_data in record.get("tdos_per_site", {}).items():
+        e = site_data["energies"]
+        entry["sites"][site_key] = [float(e.min()), float(e.max())]
+    return entry
+
+
+def load_index(folder):
+    path = index_path(folder)
+    if not os.path.exists(path):
+        return {"version": INDEX_VERSION, "folder": folder, "files": {}}
+    with open(path, "r") as f:
+        index = json.load(f)
+    if index.get("version") != INDEX_VERSION:
+        return {"version": INDEX_VERSION, "folder": folder, "files": {}}
+    return index
+
+
+def save_index(index, folder):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    path = index_path(folder)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def _stored_files(store):
+    """Position, mtime and size of each file in a binary store.
+
+    Only float64 stores are used, as they hold the JSON values exactly.
+    """
+    if store is None or store["manifest"]["dtype"] != "float64":
+        return {}
+    return {entry["fname"]: (i, entry["mtime_ns"], entry["size"]) for i, entry in enumerate(store["manifest"]["files"])}
+
+
+def update_index(folder, verbose=True):
+    """Bring the index for ``folder`` up to date and return it.
+
+    Unchanged files are taken from the stored index; only files whose mtime or
+    size differ (or that are new) are summarized again, from the binary store
+    when it holds the same version of the file and by parsing the JSON
+    otherwise. Removed files are dropped.
+    """
+    # store.py builds on this module, so import it lazily
+    from lsodos.store import open_store, store_record
+
+    index = load_index(folder)
+    old_files = index["files"]
+    new_files = {}
+    store, stored = None, None
+    n_parsed = n_stored = 0
+
+    for fname in list_json_files(folder):
+        fpath = os.path.join(folder, fname)
+        mtime_ns, size = file_key(fpath)
+        entry = old_files.get(fname)
+        if entry is None or entry["mtime_ns"] != mtime_ns or entry["size"] != size:
+            if stored is None:
+                store = open_store(folder)
+                stored = _stored_files(store)
+            position = stored.get(fname)
+            if position is not None and position[1:] == (mtime_ns, size):
+                entry = summarize_record(store_record(store, position[0]))
+                n_stored += 1
+            else:
+                entry = summarize_record(read_dos_file(fpath))
+                n_parsed += 1
+            entry["mtime_ns"] = mtime_ns
+            entry["size"] = size
+        new_files[fname] = entry
+
+    changed = n_parsed + n_stored > 0 or len(new_files) != len(old_files)
+    index["files"] = new_files
+    if changed:
+        save_index(index, folder)
+    if verbose and changed:
+        print(f"Metadata index for {folder}: {n_parsed} file(s) parsed, {n_stored} read from the store, "
+              f"{len(new_files)} indexed")
+    return index
+
+
+def energy_range(index, sites=None, require_b2=False):
+    """Global (emin, emax) over the total DOS, or over the given per-site keys."""
+    emin, emax = float("inf"), float("-inf")
+    for entry in index["files"].values():
+        if require_b2 and not entry["has_b2"]:
+            continue
+        if sites is None:
+            emin = min(emin, entry["emin"])
+            emax = max(emax, entry["emax"])
+            continue
+        for site in sites:
+            bounds = entry["sites"].get(str(site))
+            if bounds is None:
+                continue
+            emin = min(emin, bounds[0])
+            emax = max(emax, bounds[1])
+    return emin, emax
+
+
+def site_energy_ranges(index, require_b2=True):
+    ranges = {}
+    for entry in index["files"].values():
+        if require_b2 and not entry["has_b2"]:
+            continue
+        for site_key, (lo, hi) in entry["sites"].items():
+            old_lo, old_hi = ranges.get(site_key, (float("inf"), float("-inf")))
+            ranges[site_key] = (min(old_lo, lo), max(old_hi, hi))
+    return dict(sorted(ranges.items(), key=lambda kv: int(kv[0])))
+
+
+def mean_spacings(index):
+    return pd.DataFrame(
+        [(entry["material"], entry["mean_spacing"]) for entry in index["files"].values()],
+        columns=["material", "avg_spacing"],
+    )
+
+
+def lowest_mean_spacing(index, decimals=PRINTED_DECIMALS):
+    spacing = min(entry["mean_spacing"] for entry in index["files"].values())
+    return round(spacing, decimals)
+
+
+def files_missing_b2(index):
+    return [fname for fname, entry in index["files"].items() if not entry["has_b2"]]
+
+
+def band_edges(csv_file=BAND_CSV, decimals=PRINTED_DECIMALS):
+    """Return (max CBM, max VBM) across all materials in the band-structure table."""
+    df = pd.read_csv(csv_file, usecols=["CBM", "VBM"])
+    return round(float(df["CBM"].max()), decimals), round(float(df["VBM"].max()), decimals)
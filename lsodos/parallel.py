@@ -0,0 +1,90 @@
+"""Process-pool execution of per-material work over a corpus folder."""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lsodos.ingest import iter_corpus, list_json_files, read_dos_file
+from lsodos.store import open_store, store_is_fresh, store_record
+
+WORKERS_ENV = "LSODOS_WORKERS"
+DEFAULT_CHUNKSIZE = 16
+
+
+def default_workers():
+    """Worker count from $LSODOS_WORKERS, else every core."""
+    value = os.environ.get(WORKERS_ENV)
+    if value:
+        return max(1, int(value))
+    return os.cpu_count() or 1
+
+
+def _mp_context():
+    # The generators are plain scripts without a __main__ guard, so workers
+    # must be forked rather than spawned (spawn would re-run the script).
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def _corpus_order(folder, use_store):
+    if use_store:
+        store = open_store(folder)
+        if store is not None and store_is_fresh(store, folder):
+            return [entry["fname"] for entry in store["manifest"]["files"]], True
+    return list_json_files(folder), False
+
+
+def corpus_order(folder, use_store=True):
+    """File names of ``folder`` in the order ``iter_corpus`` yields them."""
+    return _corpus_order(folder, use_store)[0]
+
+
+def _records(folder, fnames, sites, from_store):
+    if from_store:
+        store = open_store(folder)
+        position = {entry["fname"]: i for i, entry in enumerate(store["manifest"]["files"])}
+        return (store_record(store, position[fname], sites=sites) for fname in fnames)
+    return (read_dos_file(os.path.join(folder, fname), sites=sites) for fname in fnames)
+
+
+def _run_chunk(func, folder, fnames, sites, from_store):
+    return [func(record) for record in _records(folder, fnames, sites, from_store)]
+
+
+def imap_corpus(func, folder, sites=None, n_workers=1, chunksize=DEFAULT_CHUNKSIZE, use_store=True, fnames=None):
+    """Yield ``func(record)`` for every material in ``folder``.
+
+    Results come out in the same order as ``iter_corpus`` yields records, no
+    matter how many workers are used, so the serial and parallel paths write
+    identical datasets. Files are dispatched to the workers in chunks of
+    ``chunksize`` and each worker reads its own files; at most two chunks per
+    worker are in flight, so memory stays flat however large the corpus is
+    and however slowly the results are consumed. ``fnames`` restricts the
+    pass to those files, in the order given.
+    """
+    if n_workers <= 1 and fnames is None:
+        for record in iter_corpus(folder, sites=sites, use_store=use_store):
+            yield func(record)
+        return
+
+    order, from_store = _corpus_order(folder, use_store)
+    if fnames is None:
+        fnames = order
+    if n_workers <= 1:
+        for record in _records(folder, fnames, sites, from_store):
+            yield func(record)
+        return
+
+    chunks = (fnames[i:i + chunksize] for i in range(0, len(fnames), chunksize))
+    run = partial(_run_chunk, func, folder, sites=sites, from_store=from_store)
+
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=_mp_context()) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(run, chunk))
+            if len(pending) >= 2 * n_workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
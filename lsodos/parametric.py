@@ -0,0 +1,291 @@
+"""Parametric UMAP encoders of the DOS datasets.
+
+``parametric_for`` trains (once) a ``ParametricUMAP`` on a pipeline dataset,
+the way ``bokeh_implementations/parametricumap/mnist_parametric_umap.py`` does
+for MNIST: a small dense Keras encoder maps a ``MaxAbsScaler``-scaled feature
+row straight to its 2D coordinates. The model is saved next to the dataset, in
+``<dataset>_<n_neighbors>_<metric>_<tag>.parametric/``: the Keras encoder and
+pickled ``ParametricUMAP`` (``load_ParametricUMAP`` reads the folder as is),
+plus ``features.joblib`` with the scaler, the feature spec of
+``lsodos.reducer.feature_spec`` and the training embedding.
+
+``encode`` runs the encoder on the CPU in fixed-size batches, densifying one
+batch of sparse rows at a time, so embedding new materials is a forward pass
+over their feature rows rather than a refit; ``embed_files`` featurizes DOS
+files with the model's spec first. ``stream_encode`` does the same for inputs
+larger than memory (a memmap, or an iterator of row blocks) and writes the
+embedding to a ``.npy`` file batch by batch; it takes the encoder of any
+``load_ParametricUMAP`` model. Batches run ``INFERENCE_THREADS`` at a time in
+a thread pool, on TensorFlow CPU thread pools sized by $LSODOS_WORKERS.
+
+``ParametricUMAP`` trains on a dense matrix, so training densifies the whole
+(scaled, float32) dataset.
+"""
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from lsodos.embedding import embedding_params, embedding_path, load_for_embedding, source_stats
+from lsodos.knn import matrix_hash, precomputed_knn
+from lsodos.parallel import default_workers
+from lsodos.pipeline import DEFAULT_SPEC
+from lsodos.reducer import feature_spec, featurize_files
+
+ENCODER_UNITS = (256, 128)
+BATCH_SIZE = 4096
+INFERENCE_THREADS = 2
+FEATURES_FILE = "features.joblib"
+
+
+def _tensorflow():
+    """tensorflow, with its CPU thread pools sized by $LSODOS_WORKERS."""
+    import tensorflow as tf
+
+    n_threads = default_workers()
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(n_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(min(n_threads, 2))
+    except RuntimeError:
+        # the runtime is already initialized and keeps its pools
+        pass
+    return tf
+
+
+def parametric_path(dataset_file, params):
+    """Folder of a dataset's parametric model, next to the dataset."""
+    return os.path.splitext(embedding_path(dataset_file, params, os.path.dirname(dataset_file)))[0] + ".parametric"
+
+
+def build_encoder(n_features, units=ENCODER_UNITS):
+    from tensorflow.keras import layers, Sequential
+
+    return Sequential(
+        [layers.Input(shape=(n_features,))]
+        + [layers.Dense(n_units, activation="relu") for n_units in units]
+        + [layers.Dense(2)]
+    )
+
+
+def _dense(X):
+    X = X.toarray() if sparse.issparse(X) else np.asarray(X)
+    return X.astype(np.float32, copy=False)
+
+
+def iter_batches(inputs, batch_size=BATCH_SIZE):
+    """Dense float32 batches of ``batch_size`` rows (the last one shorter).
+
+    ``inputs`` is an array, memmap or sparse matrix, sliced one batch at a
+    time, or an iterable of row blocks of any size, which are regrouped.
+    """
+    if hasattr(inputs, "shape"):
+        for start in range(0, inputs.shape[0], batch_size):
+            yield _dense(inputs[start:start + batch_size])
+        return
+    blocks, n_rows = [], 0
+    for block in inputs:
+        blocks.append(_dense(block))
+        n_rows += blocks[-1].shape[0]
+        if n_rows >= batch_size:
+            rows = np.concatenate(blocks)
+            n_full = n_rows - n_rows % batch_size
+            for start in range(0, n_full, batch_size):
+                yield rows[start:start + batch_size]
+            blocks, n_rows = [rows[n_full:]], n_rows - n_full
+    if n_rows:
+        yield np.concatenate(blocks)
+
+
+def _predictor(encoder):
+    """The encoder's forward pass as a CPU function traced once for any batch length."""
+    tf = _tensorflow()
+
+    spec = tf.TensorSpec(encoder.inputs[0].shape, tf.float32)
+
+    @tf.function(input_signature=[spec])
+    def forward(batch):
+        with tf.device("/CPU:0"):
+            return encoder(batch, training=False)
+
+    forward.get_concrete_function()
+    return lambda batch: forward(batch).numpy()
+
+
+def _run_batches(encoder, inputs, batch_size, n_threads):
+    """Encoder outputs of each batch, in order.
+
+    ``n_threads`` batches run at once, sharing TensorFlow's CPU thread pool,
+    while the next batch is read; no more than twice that many batches are
+    held in memory.
+    """
+    predict = _predictor(encoder)
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        pending = deque()
+        for batch in iter_batches(inputs, batch_size):
+            pending.append(pool.submit(predict, batch))
+            if len(pending) >= 2 * n_threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def encode(encoder, X, batch_size=BATCH_SIZE, n_threads=INFERENCE_THREADS):
+    """Coordinates of the (scaled) rows of ``X``, in CPU batches of ``batch_size`` rows."""
+    outputs = list(_run_batches(encoder, X, batch_size, n_threads))
+    if not outputs:
+        return np.zeros((0, encoder.outputs[0].shape[-1]), dtype=np.float32)
+    return np.concatenate(outputs)
+
+
+def stream_encode(encoder, inputs, out_path, batch_size=BATCH_SIZE, n_threads=INFERENCE_THREADS, n_rows=None,
+                  verbose=True):
+    """Embed ``inputs`` batch by batch into the ``.npy`` file ``out_path``.
+
+    ``inputs`` is anything ``iter_batches`` takes, e.g. an ``np.load(...,
+    mmap_mode="r")`` array or a generator reading row blocks from disk, and
+    ``encoder`` e.g. ``load_ParametricUMAP(path).encoder``. Each batch is
+    written as soon as it is embedded, so neither the inputs nor the
+    embedding need to fit in memory. When the number of rows is known (from
+    ``inputs.shape`` or ``n_rows``) the batches go straight into a memory-mapped
+    ``.npy``; otherwise they are appended to a raw file that gets its ``.npy``
+    header once the inputs are exhausted. Returns the embedding memory-mapped.
+    """
+    n_rows = inputs.shape[0] if hasattr(inputs, "shape") else n_rows
+    n_components = encoder.outputs[0].shape[-1]
+    tmp_path = out_path + ".tmp"
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    done = 0
+    if n_rows is not None:
+        embedding = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(n_rows, n_components))
+        for coordinates in _run_batches(encoder, inputs, batch_size, n_threads):
+            embedding[done:done + len(coordinates)] = coordinates
+            done += len(coordinates)
+        if done != n_rows:
+            raise ValueError(f"expected {n_rows} input rows, got {done}")
+        embedding.flush()
+        del embedding
+    else:
+        with open(tmp_path + ".raw", "wb") as raw:
+            for coordinates in _run_batches(encoder, inputs, batch_size, n_threads):
+                raw.write(np.ascontiguousarray(coordinates, dtype=np.float32).tobytes())
+                done += len(coordinates)
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)), "fortran_order": False,
+                  "shape": (done, n_components)}
+        with open(tmp_path, "wb") as f, open(tmp_path + ".raw", "rb") as raw:
+            np.lib.format.write_array_header_1_0(f, header)
+            shutil.copyfileobj(raw, f)
+        os.remove(tmp_path + ".raw")
+    os.replace(tmp_path, out_path)
+    if verbose:
+        print(f"Saved {done} embedded rows to {out_path}")
+    return np.load(out_path, mmap_mode="r")
+
+
+def train_parametric(dataset_file, params, spec=DEFAULT_SPEC, units=ENCODER_UNITS, verbose=True):
+    """Train a parametric UMAP on a dataset; returns the model dict."""
+    _tensorflow()
+    from sklearn.preprocessing import MaxAbsScaler
+    from umap.parametric_umap import ParametricUMAP
+
+    dataset, grid = feature_spec(dataset_file, spec)
+    materials, X = load_for_embedding(dataset_file, params["properties_file"])
+    scaler = MaxAbsScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    knn = precomputed_knn(X_scaled, params["n_neighbors"], params["metric"], random_state=params["random_state"])
+    embedder = ParametricUMAP(
+        encoder=build_encoder(X.shape[1], units),
+        dims=(X.shape[1],),
+        n_neighbors=params["n_neighbors"],
+        metric=params["metric"],
+        min_dist=params["min_dist"],
+        random_state=params["random_state"],
+        precomputed_knn=knn,
+        verbose=verbose,
+    )
+    embedder.fit(_dense(X_scaled))
+    return {
+        "params": params,
+        "units": list(units),
+        "dataset": dataset,
+        "grid": grid,
+        "scaler": scaler,
+        "embedder": embedder,
+        "materials": materials,
+        "embedding": encode(embedder.encoder, X_scaled),
+        "input_hash": matrix_hash(X),
+        "sources": source_stats(dataset_file, params["properties_file"]),
+    }
+
+
+def save_parametric(path, model):
+    import joblib
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    embedder = model["embedder"]
+    # the training model wraps the encoder in layers Keras cannot serialize;
+    # embedding only needs the encoder
+    parametric_model, embedder.parametric_model = embedder.parametric_model, None
+    try:
+        embedder.save(tmp_path, verbose=False, exclude_raw_data=True)
+    finally:
+        embedder.parametric_model = parametric_model
+    joblib.dump({key: value for key, value in model.items() if key not in ("embedder", "path")},
+                os.path.join(tmp_path, FEATURES_FILE))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load_parametric(path):
+    import joblib
+
+    _tensorflow()
+    from umap.parametric_umap import load_ParametricUMAP
+
+    model = joblib.load(os.path.join(path, FEATURES_FILE))
+    model["embedder"] = load_ParametricUMAP(path, verbose=False)
+    return model
+
+
+def parametric_for(dataset_file, n_neighbors=15, metric="euclidean", random_state=42, properties_file=None,
+                   min_dist=0.1, spec=DEFAULT_SPEC, units=ENCODER_UNITS, retrain=False, verbose=True):
+    """The stored parametric model of a dataset, training and saving it first if needed.
+
+    Like ``lsodos.reducer.model_for``, a stored model is kept when the dataset
+    grows; pass ``retrain=True`` to train it again on the current dataset.
+    """
+    params = embedding_params(n_neighbors, metric, False, random_state, properties_file, min_dist)
+    path = parametric_path(dataset_file, params)
+    if os.path.exists(os.path.join(path, FEATURES_FILE)) and not retrain:
+        if verbose:
+            print(f"Loaded parametric model from {path}")
+        model = load_parametric(path)
+    else:
+        if verbose:
+            print("started parametric UMAP")
+        model = train_parametric(dataset_file, params, spec, units, verbose)
+        save_parametric(path, model)
+        if verbose:
+            print(f"Saved parametric model to {path}")
+    model["path"] = path
+    return model
+
+
+def embed_matrix(model, X, batch_size=BATCH_SIZE):
+    """Coordinates of unscaled feature rows (e.g. a dataset built with the model's spec)."""
+    if X.shape[1] != model["scaler"].n_features_in_:
+        raise ValueError(f"expected {model['scaler'].n_features_in_} feature columns, got {X.shape[1]}")
+    return encode(model["embedder"].encoder, model["scaler"].transform(X), batch_size)
+
+
+def embed_files(model, fpaths, batch_size=BATCH_SIZE):
+    """``(materials, coordinates)`` of DOS files, featurized with the model's spec."""
+    materials, X = featurize_files(model, fpaths)
+    if len(materials) == 0:
+        return materials, np.zeros((0, 2), dtype=np.float32)
+    return materials, embed_matrix(model, X, batch_size)
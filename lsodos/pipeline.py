@@ -0,0 +1,437 @@
+"""Declarative dataset specs and the fused pass over the corpus that builds them.
+
+A spec is a dict (or a JSON/YAML file holding one) with a list of datasets::
+
+    {"datasets": [
+        {"out_file": "datasets/output/dos_dataset_histogram_5_ev_cutoff_after_bandgap.csv",
+         "folder": "datasets/LSODOS",
+         "channels": [["tdos", "both"]],
+         "window": ["tdos_min", "cbm+5"],
+         "dE": "lowest_spacing",
+         "mode": "histogram"},
+        ...
+    ]}
+
+``channels`` holds ``[group, spin]`` pairs as in ``lsodos.featurize``; a group
+is ``"tdos"`` or a list of per-site keys that are summed. Several channels are
+written side by side with ``<group>_<spin>_`` column prefixes.
+
+``window`` bounds are numbers in eV or one of ``tdos_min``/``tdos_max`` (range
+of the total DOS over the folder), ``sites_min``/``sites_max`` (range of the
+per-site DOS over materials that have a B2 site) and ``vbm<offset>``/
+``cbm<offset>`` (band edges from the band-structure table, e.g. ``cbm+5``).
+``dE`` is a number or ``lowest_spacing`` (finest mean grid spacing in the
+folder). ``mode`` is ``histogram`` (bins between ``np.arange`` edges) or one
+of the ``lsodos.resample`` kinds ``nearest``, ``linear`` or ``integral``
+(resampling onto the ``np.arange`` points).
+
+``dE`` can also be a list of ``[from, dE]`` steps for a grid whose spacing
+changes with energy, e.g. finest around the valence band maximum, 0.02 eV
+over the rest of the gap region and coarser below it::
+
+    "dE": [["sites_min", 0.5], ["vbm-15", 0.05], ["vbm-5", 0.02], ["vbm-1", "lowest_spacing"], ["vbm+1", 0.02]]
+
+``from`` takes the same values as the window bounds and each spacing applies
+up to the next step (see ``lsodos.binning.multiresolution_grid``). The
+datasets record their exact edges either way.
+
+Optional keys: ``name`` (to pick datasets with ``select_datasets``),
+``require_b2`` (skip materials without site 9), ``drop_empty``
+(skip all-zero rows), ``channel_labels``, ``formats`` and ``dtype`` (see
+``lsodos.datasets``).
+
+Datasets are grouped by folder and each folder is read once; datasets that
+share a grid share one batched histogram call per material. The datasets the
+repo uses are listed in ``DEFAULT_SPEC``.
+
+Each folder is first brought up to date in the binary store of
+``lsodos.store``, which parses only new or changed JSONs. The metadata index
+and the featurization both read from the store, so a file is parsed once
+however many datasets and grids use it.
+
+Rebuilds are incremental: a dataset whose spec and grid are unchanged only
+has the rows of added or modified corpus files recomputed (see ``run_pass``).
+"""
+import json
+import os
+import re
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from lsodos import cache, resample
+from lsodos.binning import multiresolution_grid
+from lsodos.datasets import (DEFAULT_FORMATS, DatasetWriter, check_dtype, dataset_paths, default_dtype,
+                             load_csv_dataset, load_dataset)
+from lsodos.featurize import TDOS, channel_sites, histogram_channels, resample_channels
+from lsodos.metadata import band_edges, energy_range, lowest_mean_spacing, update_index
+from lsodos.parallel import corpus_order, default_workers, imap_corpus
+from lsodos.store import update_store
+
+DEFAULT_SPEC = str(Path(__file__).resolve().parents[1] / "bokeh_implementations" / "lso_dos_data"
+                   / "generate_datasets" / "datasets.json")
+
+HISTOGRAM = "histogram"
+MODES = (HISTOGRAM,) + resample.KINDS
+DEFAULTS = {
+    "dE": "lowest_spacing",
+    "mode": HISTOGRAM,
+    "require_b2": False,
+    "drop_empty": False,
+    "channel_labels": None,
+    "formats": list(DEFAULT_FORMATS),
+    "dtype": None,
+}
+BAND_EDGE_PATTERN = re.compile(r"^(vbm|cbm)([+-]\d+(?:\.\d*)?)?$")
+
+
+def load_spec(path):
+    with open(path, "r") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def select_datasets(spec, names):
+    """A spec with only the named datasets of ``spec``, in the order given."""
+    by_name = {dataset.get("name"): dataset for dataset in spec["datasets"]}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise KeyError(f"datasets not in spec: {unknown}")
+    return {"datasets": [by_name[name] for name in names]}
+
+
+def normalize_channel(channel):
+    group, spin = channel
+    if group != TDOS:
+        group = tuple(str(site) for site in group)
+    return group, str(spin)
+
+
+def channel_label(channel):
+    group, spin = channel
+    return f"{group if group == TDOS else '+'.join(group)}_{spin}"
+
+
+def normalize_dataset(dataset):
+    dataset = dict(DEFAULTS, **dataset)
+    missing = [key for key in ("out_file", "folder", "channels", "window") if key not in dataset]
+    if missing:
+        raise ValueError(f"dataset spec is missing {missing}: {dataset}")
+    if dataset["mode"] not in MODES:
+        raise ValueError(f"unknown mode {dataset['mode']!r}, expected one of {MODES}")
+    dataset["dtype"] = default_dtype() if dataset["dtype"] is None else check_dtype(dataset["dtype"])
+    if isinstance(dataset["dE"], (list, tuple)):
+        if not dataset["dE"] or any(len(step) != 2 for step in dataset["dE"]):
+            raise ValueError(f"dE steps must be [from, dE] pairs, got {dataset['dE']!r}")
+        dataset["dE"] = [list(step) for step in dataset["dE"]]
+    dataset["channels"] = [normalize_channel(channel) for channel in dataset["channels"]]
+    if dataset["channel_labels"] is None and len(dataset["channels"]) > 1:
+        dataset["channel_labels"] = [channel_label(channel) for channel in dataset["channels"]]
+    return dataset
+
+
+def resolve_bound(value, index):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if value in ("tdos_min", "tdos_max"):
+        return energy_range(index)[value == "tdos_max"]
+    if value in ("sites_min", "sites_max"):
+        sites = {site for entry in index["files"].values() for site in entry["sites"]}
+        return energy_range(index, sites=sorted(sites, key=int), require_b2=True)[value == "sites_max"]
+    match = BAND_EDGE_PATTERN.match(value)
+    if match is None:
+        raise ValueError(f"unknown window bound {value!r}")
+    cbm, vbm = band_edges()
+    edge = cbm if match.group(1) == "cbm" else vbm
+    return edge + float(match.group(2)) if match.group(2) else edge
+
+
+def resolve_spacing(value, index):
+    return lowest_mean_spacing(index) if value == "lowest_spacing" else float(value)
+
+
+def resolve_grid(dataset, index):
+    """The (mode, points) grid of a dataset: bin edges or resampling points."""
+    emin, emax = (resolve_bound(bound, index) for bound in dataset["window"])
+    if isinstance(dataset["dE"], list):
+        steps = [(resolve_bound(start, index), resolve_spacing(dE, index)) for start, dE in dataset["dE"]]
+        return dataset["mode"], multiresolution_grid(emin, emax, steps)
+    dE = resolve_spacing(dataset["dE"], index)
+    return dataset["mode"], np.arange(emin, emax + dE, dE)
+
+
+def plan(spec, use_store=True):
+    """Group the datasets of ``spec`` into one pass per corpus folder.
+
+    Each pass lists its distinct grids and, per grid, the channels every
+    dataset on that grid needs, so a material is binned once per grid. With
+    ``use_store`` the folder's binary store is updated first and the pass
+    reads from it.
+    """
+    passes = {}
+    for dataset in spec["datasets"]:
+        dataset = normalize_dataset(dataset)
+        folder = dataset["folder"]
+        if folder not in passes:
+            if use_store:
+                update_store(folder, verbose=False)
+            index = update_index(folder)
+            passes[folder] = {"folder": folder, "index": index, "fingerprint": cache.corpus_fingerprint(index),
+                              "use_store": use_store, "grids": [], "datasets": []}
+        current = passes[folder]
+
+        mode, points = resolve_grid(dataset, current["index"])
+        dataset["cache_key"] = cache.dataset_key(dataset, mode, points, current["fingerprint"])
+        dataset["build_key"] = cache.dataset_key(dataset, mode, points, None)
+        for i, grid in enumerate(current["grids"]):
+            if grid["mode"] == mode and np.array_equal(grid["points"], points):
+                break
+        else:
+            current["grids"].append({"mode": mode, "points": points, "channels": []})
+            i = len(current["grids"]) - 1
+        grid = current["grids"][i]
+        for channel in dataset["channels"]:
+            if channel not in grid["channels"]:
+                grid["channels"].append(channel)
+        dataset["grid"] = i
+        current["datasets"].append(dataset)
+
+    for current in passes.values():
+        current["sites"] = channel_sites([c for dataset in current["datasets"] for c in dataset["channels"]])
+    return list(passes.values())
+
+
+def bin_centers(grid):
+    points = grid["points"]
+    if grid["mode"] == HISTOGRAM:
+        return 0.5 * (points[:-1] + points[1:])
+    return points
+
+
+def featurize_pass(record, grids, datasets):
+    """Rows of every dataset in a pass for one material (None when skipped)."""
+    keep = [not (dataset["require_b2"] and not record["has_b2"]) for dataset in datasets]
+    features = []
+    for i, grid in enumerate(grids):
+        needed = {channel for dataset, kept in zip(datasets, keep) if kept and dataset["grid"] == i
+                  for channel in dataset["channels"]}
+        channels = [channel for channel in grid["channels"] if channel in needed]
+        if grid["mode"] == HISTOGRAM:
+            values = histogram_channels(record, channels, grid["points"]) if channels else []
+        else:
+            values = resample_channels(record, channels, grid["points"], kind=grid["mode"])
+        features.append(dict(zip(channels, values)))
+
+    rows = []
+    for dataset, kept in zip(datasets, keep):
+        if not kept:
+            rows.append(None)
+            continue
+        row = [features[dataset["grid"]][channel] for channel in dataset["channels"]]
+        rows.append(row[0] if len(row) == 1 else np.concatenate(row))
+    return {"fname": record["fname"], "material": record["material"], "rows": rows}
+
+
+def load_sources(out_file):
+    try:
+        with open(dataset_paths(out_file)["sources"], "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_sources(out_file, build_key, files):
+    path = dataset_paths(out_file)["sources"]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"build_key": build_key, "files": files}, f)
+    os.replace(tmp_path, path)
+
+
+def remove_sources(out_file):
+    try:
+        os.remove(dataset_paths(out_file)["sources"])
+    except FileNotFoundError:
+        pass
+
+
+def load_previous(dataset):
+    """The rows of an earlier build of ``dataset`` on the same grid, or None.
+
+    An earlier build can only be reused when its spec and grid match; a new
+    file that widens a ``tdos_min``/``sites_max``-style window changes the
+    grid and so forces a full rebuild.
+    """
+    sources = load_sources(dataset["out_file"])
+    if sources is None or sources["build_key"] != dataset["build_key"]:
+        return None
+    # rows are copied into the float64 CSV too, so take them from there when
+    # the .npz is stored at a lower precision
+    load = load_csv_dataset if dataset["dtype"] != "float64" and "csv" in dataset["formats"] else load_dataset
+    try:
+        materials, matrix, _ = load(dataset["out_file"])
+    except (OSError, ValueError, KeyError):
+        return None
+    position = {material: i for i, material in enumerate(materials)}
+    # a build that lost rows (e.g. written by an older version that did not
+    # stage its outputs) no longer matches its sources: rebuild it
+    if any(source["row"] and source["material"] not in position for source in sources["files"].values()):
+        print(f"Rebuilding {dataset['out_file']} (rows missing from its last build)")
+        return None
+    return {"files": sources["files"], "matrix": matrix, "position": position}
+
+
+def stale_files(previous, index, order):
+    """Files in ``order`` that are new or changed since any of the ``previous`` builds."""
+    stale = set()
+    for fname in order:
+        entry = index["files"].get(fname)
+        for build in previous:
+            source = build["files"].get(fname)
+            if (entry is None or source is None or source["mtime_ns"] != entry["mtime_ns"]
+                    or source["size"] != entry["size"]):
+                stale.add(fname)
+                break
+    return stale
+
+
+def previous_rows(previous, fname):
+    rows = []
+    for build in previous:
+        source = build["files"][fname]
+        if source["row"]:
+            rows.append(build["matrix"][build["position"][source["material"]]].toarray().ravel())
+        else:
+            rows.append(None)
+    return source["material"], rows
+
+
+def run_pass(current, n_workers=1, previous=None):
+    """Build the datasets of one pass.
+
+    ``previous`` holds an earlier build of each dataset (see
+    ``load_previous``). Then only files that were added or changed since are
+    featurized; the rows of unchanged files are copied over and rows of
+    removed files are dropped, which gives the same result as a full rebuild.
+    The outputs are only replaced once every row is written, so an
+    interrupted pass leaves the previous build as it was.
+    """
+    folder, grids, datasets = current["folder"], current["grids"], current["datasets"]
+    order = corpus_order(folder, use_store=current["use_store"])
+    if previous:
+        stale = stale_files(previous, current["index"], order)
+        removed = {fname for build in previous for fname in build["files"]} - set(order)
+        print(f"Updating {len(datasets)} dataset(s) from {folder}: "
+              f"{len(stale)} new or changed, {len(removed)} removed file(s)")
+    else:
+        stale = set(order)
+
+    featurize = partial(featurize_pass, grids=grids, datasets=datasets)
+    fresh = imap_corpus(featurize, folder, sites=current["sites"], n_workers=n_workers, use_store=current["use_store"],
+                        fnames=[fname for fname in order if fname in stale] if previous else None)
+    sources = [{} for _ in datasets]
+    writers = []
+    finished = False
+    try:
+        for dataset in datasets:
+            grid = grids[dataset["grid"]]
+            writers.append(DatasetWriter(
+                dataset["out_file"], bin_centers(grid), channels=dataset["channel_labels"],
+                formats=dataset["formats"], bin_edges=grid["points"] if grid["mode"] == HISTOGRAM else None,
+                dtype=dataset["dtype"],
+            ))
+        for fname in order:
+            if fname in stale:
+                result = next(fresh)
+                material, rows = result["material"], result["rows"]
+                if any(row is None for row in rows):
+                    print(f"Skipping {fname} (no key 9)")
+                rows = [None if row is None or (dataset["drop_empty"] and not np.any(row != 0)) else row
+                        for dataset, row in zip(datasets, rows)]
+            else:
+                material, rows = previous_rows(previous, fname)
+            entry = current["index"]["files"][fname]
+            for dataset_sources, writer, row in zip(sources, writers, rows):
+                dataset_sources[fname] = {"mtime_ns": entry["mtime_ns"], "size": entry["size"],
+                                          "material": material, "row": row is not None}
+                if row is not None:
+                    writer.append(material, row)
+        finished = True
+    finally:
+        if not finished:
+            # an interrupted pass leaves the last complete build (and the
+            # sources it was built from) in place
+            for writer in writers:
+                writer.abort()
+
+    for dataset, writer, dataset_sources in zip(datasets, writers, sources):
+        # outputs and sources are replaced one after the other; without
+        # sources a half-replaced dataset is rebuilt from scratch next time
+        remove_sources(dataset["out_file"])
+        writer.close()
+        save_sources(dataset["out_file"], dataset["build_key"], dataset_sources)
+        print(f"Saved {dataset['out_file']}")
+
+
+def sub_pass(current, datasets):
+    channels = [channel for dataset in datasets for channel in dataset["channels"]]
+    return dict(current, datasets=datasets, sites=channel_sites(channels))
+
+
+def restore_cached(current):
+    """Restore the datasets of a pass that are cached; return the rest."""
+    pending = []
+    for dataset in current["datasets"]:
+        if cache.restore(dataset["cache_key"], dataset["out_file"]):
+            print(f"Restored {dataset['out_file']} from cache")
+        else:
+            pending.append(dataset)
+    return sub_pass(current, pending)
+
+
+def split_incremental(current):
+    """Split a pass into datasets that can be updated and ones to rebuild.
+
+    Returns ``[(pass, previous builds or None), ...]`` without empty passes.
+    """
+    builds = [load_previous(dataset) for dataset in current["datasets"]]
+    update = [dataset for dataset, build in zip(current["datasets"], builds) if build is not None]
+    rebuild = [dataset for dataset, build in zip(current["datasets"], builds) if build is None]
+    parts = []
+    if update:
+        parts.append((sub_pass(current, update), [build for build in builds if build is not None]))
+    if rebuild:
+        parts.append((sub_pass(current, rebuild), None))
+    return parts
+
+
+def run_pipeline(spec, n_workers=None, use_cache=True, incremental=True, use_store=True):
+    """Build every dataset in ``spec`` (a dict or a path to a JSON/YAML file).
+
+    With ``use_cache`` a dataset built before from the same spec, grid and
+    corpus files is copied from ``lsodos.cache`` instead of being rebuilt, and
+    only the remaining datasets are featurized. With ``incremental`` those
+    are updated from their last build when its spec and grid still match
+    (see ``run_pass``) and rebuilt from scratch otherwise. Without
+    ``use_store`` the corpus is read from the JSONs (see ``plan``).
+    """
+    if isinstance(spec, (str, os.PathLike)):
+        spec = load_spec(spec)
+    if n_workers is None:
+        n_workers = default_workers()
+    for current in plan(spec, use_store=use_store):
+        if use_cache:
+            current = restore_cached(current)
+        if not current["datasets"]:
+            continue
+        parts = split_incremental(current) if incremental else [(current, None)]
+        for part, previous in parts:
+            run_pass(part, n_workers=n_workers, previous=previous)
+        if use_cache:
+            for dataset in current["datasets"]:
+                cache.store(dataset["cache_key"], dataset["out_file"], description=dataset["out_file"])
+    if use_cache:
+        cache.evict()
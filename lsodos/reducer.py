@@ -0,0 +1,228 @@
+"""Fitted UMAP models that place new materials into an existing embedding.
+
+``model_for`` fits (once) and stores, per dataset and UMAP parameters, the
+fitted ``umap.UMAP``, the fitted ``MaxAbsScaler`` and the feature spec: the
+normalized pipeline dataset (channels, mode, ``require_b2``...) plus its exact
+grid from the dataset's saved axis. ``place`` featurizes new DOS files with
+that spec, so the features line up column for column with the training
+matrix even after the data-derived window of the dataset has moved, and
+returns their coordinates from ``reducer.transform`` without refitting.
+
+Every placement is logged next to the model, and ``drift`` summarizes the
+log against the training set:
+
+``fraction``
+    Materials placed since the fit, over the number fitted on.
+``novelty``
+    Median, over the placed materials, of the distance to their nearest
+    training material divided by the median nearest-neighbour distance
+    within the training set (in scaled feature space, with the model's
+    metric). Around 1 means the additions look like the training data.
+
+``needs_refit`` is true once either passes ``REFIT_FRACTION`` or
+``REFIT_NOVELTY``; a refit then moves the whole map once instead of every
+time a material is added. densMAP models cannot transform, so models are
+always plain UMAP.
+
+Models also keep the scaled training matrix (for the novelty scores) and
+every material of the dataset they were fitted from, including those left
+out for lack of properties, so ``new_files`` only finds materials that were
+added to the corpus since.
+"""
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+from lsodos.datasets import load_energy_axis, load_materials
+from lsodos.embedding import embedding_params, embedding_path, load_for_embedding, source_stats
+from lsodos.featurize import channel_sites
+from lsodos.ingest import list_json_files, material_name, read_dos_file
+from lsodos.knn import matrix_hash
+from lsodos.pipeline import DEFAULT_SPEC, HISTOGRAM, featurize_pass, load_spec, normalize_dataset
+
+MODEL_DIR = os.path.join("datasets", "output", "models")
+MODEL_VERSION = 2
+REFIT_FRACTION = 0.1
+REFIT_NOVELTY = 2.0
+
+
+def feature_spec(dataset_file, spec=DEFAULT_SPEC):
+    """The pipeline dataset that builds ``dataset_file`` and the grid it was built on."""
+    if isinstance(spec, (str, os.PathLike)):
+        spec = load_spec(spec)
+    target = os.path.normpath(dataset_file)
+    for dataset in spec["datasets"]:
+        if os.path.normpath(dataset["out_file"]) == target:
+            dataset = normalize_dataset(dataset)
+            break
+    else:
+        raise KeyError(f"{dataset_file} is not built by the dataset spec")
+    edges = load_energy_axis(dataset_file, edges=True)
+    points = edges if dataset["mode"] == HISTOGRAM else load_energy_axis(dataset_file)
+    if dataset["mode"] == HISTOGRAM and edges is None:
+        raise ValueError(f"{dataset_file} has no saved bin edges; rebuild it with the pipeline")
+    return dataset, {"mode": dataset["mode"], "points": np.asarray(points), "channels": dataset["channels"]}
+
+
+def featurize_files(model, fpaths):
+    """Feature rows of DOS files with a model's spec; returns ``(materials, csr)``.
+
+    Files the dataset would skip (no B2 site with ``require_b2``, all-zero rows
+    with ``drop_empty``) are left out.
+    """
+    dataset, grid = model["dataset"], model["grid"]
+    sites = channel_sites(dataset["channels"])
+    materials, rows = [], []
+    for fpath in fpaths:
+        record = read_dos_file(fpath, sites=sites)
+        row = featurize_pass(record, [grid], [dict(dataset, grid=0)])["rows"][0]
+        if row is None or (dataset["drop_empty"] and not np.any(row != 0)):
+            print(f"Skipping {os.path.basename(fpath)} (not in {os.path.basename(dataset['out_file'])})")
+            continue
+        materials.append(record["material"])
+        rows.append(row)
+    n_columns = model["scaler"].n_features_in_
+    return np.array(materials, dtype=object), sparse.csr_matrix(np.array(rows).reshape(len(rows), n_columns))
+
+
+def _nearest_distances(X, Y, metric, exclude_self=False):
+    from sklearn.metrics import pairwise_distances
+
+    distances = pairwise_distances(X, Y, metric=metric)
+    if exclude_self:
+        np.fill_diagonal(distances, np.inf)
+    return distances.min(axis=1)
+
+
+def fit_model(dataset_file, params, spec=DEFAULT_SPEC):
+    """Fit the scaler and UMAP on a dataset; returns the model dict."""
+    import umap
+    from sklearn.preprocessing import MaxAbsScaler
+
+    dataset, grid = feature_spec(dataset_file, spec)
+    materials, X = load_for_embedding(dataset_file, params["properties_file"])
+    scaler = MaxAbsScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    # no precomputed_knn: transform needs the search index UMAP builds itself
+    reducer = umap.UMAP(n_neighbors=params["n_neighbors"], metric=params["metric"], min_dist=params["min_dist"],
+                        random_state=params["random_state"])
+    embedding = reducer.fit_transform(X_scaled)
+    return {
+        "version": MODEL_VERSION,
+        "params": params,
+        "dataset": dataset,
+        "grid": grid,
+        "scaler": scaler,
+        "reducer": reducer,
+        "materials": materials,
+        "dataset_materials": load_materials(dataset_file),
+        "training": X_scaled,
+        "embedding": embedding,
+        "input_hash": matrix_hash(X),
+        "sources": source_stats(dataset_file, params["properties_file"]),
+        "nn_scale": float(np.median(_nearest_distances(X_scaled, X_scaled, params["metric"], exclude_self=True))),
+    }
+
+
+def model_path(dataset_file, params, model_dir=MODEL_DIR):
+    return os.path.splitext(embedding_path(dataset_file, params, model_dir))[0] + ".joblib"
+
+
+def placements_path(path):
+    return os.path.splitext(path)[0] + ".placed.json"
+
+
+def save_model(path, model):
+    import joblib
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+    if os.path.exists(placements_path(path)):
+        os.remove(placements_path(path))
+
+
+def load_model(path):
+    import joblib
+
+    return joblib.load(path)
+
+
+def model_for(dataset_file, n_neighbors=15, metric="euclidean", random_state=42, properties_file=None,
+              min_dist=0.1, spec=DEFAULT_SPEC, model_dir=MODEL_DIR, refit=False, verbose=True):
+    """The stored model of a dataset, fitting and saving it first if needed.
+
+    A stored model is kept even when the dataset has grown since; that is what
+    ``place`` is for. Pass ``refit=True`` (e.g. when ``needs_refit`` says so)
+    to fit it again on the current dataset. Models saved by an older version
+    of this module are fitted again.
+    """
+    params = embedding_params(n_neighbors, metric, False, random_state, properties_file, min_dist)
+    path = model_path(dataset_file, params, model_dir)
+    model = load_model(path) if os.path.exists(path) and not refit else None
+    if model is not None and model.get("version") == MODEL_VERSION:
+        if verbose:
+            print(f"Loaded model from {path}")
+    else:
+        if verbose:
+            print("started UMAP")
+        model = fit_model(dataset_file, params, spec)
+        save_model(path, model)
+        if verbose:
+            print(f"Saved model to {path}")
+    model["path"] = path
+    return model
+
+
+def load_placements(model):
+    try:
+        with open(placements_path(model["path"]), "r") as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def place(model, fpaths):
+    """Coordinates of the materials in ``fpaths`` in the model's embedding.
+
+    Returns ``(materials, coordinates)`` and adds them to the model's
+    placement log (materials placed again are updated, not counted twice).
+    """
+    materials, X = featurize_files(model, fpaths)
+    if len(materials) == 0:
+        return materials, np.zeros((0, 2))
+    X_scaled = model["scaler"].transform(X)
+    coordinates = model["reducer"].transform(X_scaled)
+    novelty = _nearest_distances(X_scaled, model["training"], model["params"]["metric"]) / (model["nn_scale"] or 1.0)
+
+    placements = load_placements(model)
+    for material, (x, y), score in zip(materials, coordinates, novelty):
+        placements[material] = {"x": float(x), "y": float(y), "novelty": float(score)}
+    path = placements_path(model["path"])
+    with open(path + ".tmp", "w") as f:
+        json.dump(placements, f)
+    os.replace(path + ".tmp", path)
+    return materials, coordinates
+
+
+def new_files(model):
+    """DOS files in the dataset's folder whose material was not in the dataset the model was fitted from."""
+    folder = model["dataset"]["folder"]
+    known = set(model["dataset_materials"])
+    return [os.path.join(folder, fname) for fname in list_json_files(folder) if material_name(fname) not in known]
+
+
+def drift(model):
+    """Drift of the placed materials against the training set (see module docstring)."""
+    placements = load_placements(model)
+    fraction = len(placements) / len(model["materials"])
+    novelty = float(np.median([p["novelty"] for p in placements.values()])) if placements else 0.0
+    return {
+        "placed": len(placements),
+        "fraction": fraction,
+        "novelty": novelty,
+        "needs_refit": fraction > REFIT_FRACTION or novelty > REFIT_NOVELTY,
+    }
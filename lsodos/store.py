@@ -0,0 +1,195 @@
+"""Binary columnar copy of a DOS JSON corpus.
+
+Each channel (energies, spin up, spin down) of each group (``tdos`` and the
+per-site keys) is one contiguous raw buffer on disk, with an offsets table
+giving every material's slice. Readers memory-map the buffers, so building
+features from the store never goes through the JSON parser again.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from lsodos.ingest import SPINS, list_json_files, material_name, read_dos_file
+from lsodos.metadata import file_key
+
+STORE_DIR = os.path.join("datasets", "output", "store")
+STORE_VERSION = 1
+FIELDS = ["energies"] + SPINS
+
+
+def store_path(folder):
+    return os.path.join(STORE_DIR, os.path.basename(os.path.normpath(folder)))
+
+
+def _buffer_name(group, field):
+    return f"{group}_{field}.bin"
+
+
+def build_store(folder, dtype="float64", verbose=True, previous=None):
+    """Convert every JSON in ``folder`` into the binary store (one pass).
+
+    Files that ``previous`` (the open store of ``folder``, at the same
+    ``dtype``) holds with the same mtime and size are copied from it rather
+    than parsed again. The store is written next to the old one and swapped
+    in once complete.
+    """
+    out_dir = store_path(folder)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    dtype = np.dtype(dtype)
+
+    reusable = {}
+    if previous is not None and np.dtype(previous["manifest"]["dtype"]) == dtype:
+        reusable = {entry["fname"]: (i, entry["mtime_ns"], entry["size"])
+                    for i, entry in enumerate(previous["manifest"]["files"])}
+
+    handles = {}
+    lengths = {}
+    files = []
+
+    file_list = list_json_files(folder)
+    for i, fname in enumerate(file_list):
+        fpath = os.path.join(folder, fname)
+        mtime_ns, size = file_key(fpath)
+        stored = reusable.get(fname)
+        if stored is not None and stored[1:] == (mtime_ns, size):
+            record = store_record(previous, stored[0])
+        else:
+            record = read_dos_file(fpath)
+
+        blocks = {"tdos": record["tdos"]}
+        blocks.update(record.get("tdos_per_site", {}))
+        for group, block in blocks.items():
+            if group not in handles:
+                handles[group] = {
+                    field: open(os.path.join(tmp_dir, _buffer_name(group, field)), "wb")
+                    for field in FIELDS
+                }
+                lengths[group] = [0] * i
+            handles[group]["energies"].write(block["energies"].astype(dtype).tobytes())
+            for spin in SPINS:
+                handles[group][spin].write(block["densities"][spin].astype(dtype).tobytes())
+        for group in lengths:
+            lengths[group].append(len(blocks[group]["energies"]) if group in blocks else 0)
+
+        files.append({
+            "fname": fname,
+            "material": record["material"],
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "efermi": record["tdos"].get("efermi"),
+            "per_site": "tdos_per_site" in record,
+            "has_b2": record["has_b2"],
+        })
+        if verbose:
+            print(f"Stored {fname} ({i + 1}/{len(file_list)})")
+
+    for group_handles in handles.values():
+        for fh in group_handles.values():
+            fh.close()
+
+    for group, group_lengths in lengths.items():
+        offsets = np.zeros(len(files) + 1, dtype=np.int64)
+        np.cumsum(group_lengths, out=offsets[1:])
+        np.save(os.path.join(tmp_dir, f"{group}_offsets.npy"), offsets)
+
+    manifest = {
+        "version": STORE_VERSION,
+        "folder": folder,
+        "dtype": dtype.name,
+        "groups": sorted(lengths, key=lambda g: (g != "tdos", int(g) if g.isdigit() else 0)),
+        "files": files,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    if verbose:
+        print(f"Saved store for {folder} to {out_dir}")
+    return out_dir
+
+
+def open_store(folder):
+    """Memory-map the store built for ``folder``; returns None if there is none."""
+    out_dir = store_path(folder)
+    manifest_file = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != STORE_VERSION:
+        return None
+
+    store = {"manifest": manifest, "buffers": {}, "offsets": {}}
+    for group in manifest["groups"]:
+        store["offsets"][group] = np.load(os.path.join(out_dir, f"{group}_offsets.npy"))
+        for field in FIELDS:
+            path = os.path.join(out_dir, _buffer_name(group, field))
+            if os.path.getsize(path) == 0:
+                store["buffers"][(group, field)] = np.zeros(0, dtype=manifest["dtype"])
+            else:
+                store["buffers"][(group, field)] = np.memmap(path, dtype=manifest["dtype"], mode="r")
+    return store
+
+
+def store_is_fresh(store, folder):
+    """True if the store covers exactly the files currently in ``folder``."""
+    stored = {entry["fname"]: (entry["mtime_ns"], entry["size"]) for entry in store["manifest"]["files"]}
+    current = list_json_files(folder)
+    if len(current) != len(stored):
+        return False
+    for fname in current:
+        if stored.get(fname) != file_key(os.path.join(folder, fname)):
+            return False
+    return True
+
+
+def update_store(folder, dtype=None, verbose=True):
+    """Bring the store of ``folder`` up to date with its JSONs; returns it opened.
+
+    Only new or changed files are parsed, the others are copied from the
+    current store. ``dtype`` defaults to the current store's, or float64.
+    """
+    store = open_store(folder)
+    if dtype is None:
+        dtype = store["manifest"]["dtype"] if store is not None else "float64"
+    if store is not None and np.dtype(store["manifest"]["dtype"]) == np.dtype(dtype) and store_is_fresh(store, folder):
+        return store
+    build_store(folder, dtype=dtype, verbose=verbose, previous=store)
+    return open_store(folder)
+
+
+def _block(store, group, i):
+    start, stop = store["offsets"][group][i], store["offsets"][group][i + 1]
+    return {
+        "energies": store["buffers"][(group, "energies")][start:stop],
+        "densities": {spin: store["buffers"][(group, spin)][start:stop] for spin in SPINS},
+    }
+
+
+def store_record(store, i, sites=None):
+    """Record ``i`` in the same layout as ``ingest.read_dos_file`` returns."""
+    entry = store["manifest"]["files"][i]
+    record = {"material": material_name(entry["fname"]), "fname": entry["fname"]}
+    record["tdos"] = _block(store, "tdos", i)
+    if entry["efermi"] is not None:
+        record["tdos"]["efermi"] = entry["efermi"]
+    if entry["per_site"]:
+        site_groups = [g for g in store["manifest"]["groups"] if g != "tdos"]
+        if sites is not None:
+            wanted = {str(s) for s in sites}
+            site_groups = [g for g in site_groups if g in wanted]
+        offsets = store["offsets"]
+        record["tdos_per_site"] = {
+            g: _block(store, g, i) for g in site_groups if offsets[g][i + 1] > offsets[g][i]
+        }
+    record["has_b2"] = entry["has_b2"]
+    return record
+
+
+def iter_store_records(store, sites=None):
+    for i in range(len(store["manifest"]["files"])):
+        yield store_record(store, i, sites=sites)
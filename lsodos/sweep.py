@@ -0,0 +1,95 @@
+"""UMAP hyperparameter sweeps over one dataset.
+
+``run_sweep`` fits every combination of a ``sweep_grid`` (n_neighbors x metric
+x min_dist x densmap) on one scaled feature matrix. The kNN graph is built
+(or taken from ``lsodos.knn``) once per metric and random state at the largest
+n_neighbors and each fit gets its first ``n_neighbors`` columns, so the graph
+is never rebuilt within a sweep. The UMAP optimizations run in forked worker processes
+($LSODOS_WORKERS, see ``lsodos.parallel``), which see the matrix and graphs
+without pickling them. Each embedding is saved as an ``lsodos.embedding``
+artifact in ``datasets/output/sweeps``; combinations whose artifact is still
+current are not refitted.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from lsodos.embedding import (embedding_params, embedding_path, fit_scaled, is_current, load_embedding,
+                              load_for_embedding, save_embedding, scale, source_stats)
+from lsodos.knn import cached_knn, matrix_hash
+from lsodos.parallel import _mp_context, default_workers
+
+SWEEP_DIR = os.path.join("datasets", "output", "sweeps")
+
+# matrix, graphs and grid of the running sweep, inherited by forked workers
+_SWEEP = {}
+
+
+def sweep_grid(n_neighbors, metrics, min_dists=(0.1,), densmaps=(False,), random_state=42, properties_file=None):
+    """Embedding parameters for every combination, metric-major."""
+    return [
+        embedding_params(k, metric, densmap, random_state, properties_file, min_dist)
+        for metric, k, min_dist, densmap in itertools.product(metrics, n_neighbors, min_dists, densmaps)
+    ]
+
+
+def knn_prefix(knn, n_neighbors):
+    # copies, because UMAP marks disconnected neighbours in place
+    indices, distances = knn
+    return indices[:, :n_neighbors].copy(), distances[:, :n_neighbors].copy(), None
+
+
+def _knn_key(params):
+    return params["metric"], params["random_state"]
+
+
+def _fit(i):
+    params = _SWEEP["grid"][i]
+    knn = knn_prefix(_SWEEP["knn"][_knn_key(params)], params["n_neighbors"])
+    return i, fit_scaled(_SWEEP["X"], params, knn)
+
+
+def run_sweep(dataset_file, grid, properties_file=None, n_workers=None, sweep_dir=SWEEP_DIR, verbose=True):
+    """Fit every embedding in ``grid``; returns the artifact path of each, in grid order."""
+    if n_workers is None:
+        n_workers = default_workers()
+    sources = source_stats(dataset_file, properties_file)
+    paths = [embedding_path(dataset_file, params, sweep_dir) for params in grid]
+    pending = [i for i, (params, path) in enumerate(zip(grid, paths)) if not is_current(path, params, sources)]
+    if verbose:
+        print(f"Sweep over {dataset_file}: {len(grid)} embedding(s), {len(pending)} to fit")
+    if not pending:
+        return paths
+
+    materials, X = load_for_embedding(dataset_file, properties_file)
+    input_hash = matrix_hash(X)
+    X_scaled = scale(X)
+    knn = {}
+    # a hand-built grid can mix random states; each gets its own graph
+    for key in dict.fromkeys(_knn_key(grid[i]) for i in pending):
+        metric, random_state = key
+        k_max = max(grid[i]["n_neighbors"] for i in pending if _knn_key(grid[i]) == key)
+        knn[key] = cached_knn(X_scaled, k_max, metric, random_state=random_state, verbose=verbose)
+
+    def save(results):
+        for i, coordinates in results:
+            save_embedding(paths[i], materials, coordinates, grid[i], input_hash, sources)
+            if verbose:
+                params = grid[i]
+                print(f"Saved {params['n_neighbors']} neighbors, {params['metric']}, min_dist {params['min_dist']}, "
+                      f"densmap {params['densmap']} to {paths[i]}")
+
+    _SWEEP.update(X=X_scaled, knn=knn, grid=grid)
+    try:
+        if n_workers <= 1 or len(pending) == 1:
+            save(map(_fit, pending))
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(pending)), mp_context=_mp_context()) as executor:
+                save(executor.map(_fit, pending))
+    finally:
+        _SWEEP.clear()
+    return paths
+
+
+def load_sweep(paths):
+    return [load_embedding(path) for path in paths]
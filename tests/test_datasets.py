@@ -0,0 +1,39 @@
+"""Rebuilding a dataset in fewer formats does not leave the old files to be loaded."""
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from lsodos.datasets import DatasetWriter, dataset_paths, load_dataset
+
+
+def write(out_file, rows, **kwargs):
+    with DatasetWriter(out_file, np.arange(3.0), **kwargs) as writer:
+        for material, row in rows.items():
+            writer.append(material, np.asarray(row, dtype=float))
+
+
+def test_csv_only_rebuild_drops_old_npz(tmp_path):
+    out_file = str(tmp_path / "dataset.csv")
+    write(out_file, {"a": [1, 0, 2], "b": [0, 3, 0]}, dtype="float16")
+    write(out_file, {"c": [4, 5, 6]}, formats=["csv"])
+
+    paths = dataset_paths(out_file)
+    assert not any(os.path.exists(paths[kind]) for kind in ("npz", "meta", "scale"))
+    materials, X, _ = load_dataset(out_file)
+    assert list(materials) == ["c"]
+    assert np.array_equal(X.toarray(), [[4, 5, 6]])
+
+
+def test_npz_only_rebuild_drops_old_csv(tmp_path):
+    out_file = str(tmp_path / "dataset.csv")
+    write(out_file, {"a": [1, 0, 2]}, dtype="float16")
+    write(out_file, {"c": [4, 5, 6]}, formats=["npz"], dtype="float64")
+
+    paths = dataset_paths(out_file)
+    assert not any(os.path.exists(paths[kind]) for kind in ("csv", "rows", "scale"))
+    materials, X, _ = load_dataset(out_file)
+    assert list(materials) == ["c"]
+    assert np.array_equal(X.toarray(), [[4, 5, 6]])
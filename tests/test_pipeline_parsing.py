@@ -0,0 +1,89 @@
+"""Every corpus file is parsed once per run_pipeline call, cold or incremental."""
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from lsodos.datasets import load_dataset, load_energy_axis
+from lsodos.pipeline import run_pipeline
+
+FOLDER = os.path.join("datasets", "corpus")
+
+
+def write_material(name, shift=0.0, n_points=200):
+    energies = -10.0 + shift + 0.05 * np.arange(n_points)
+    block = {"energies": energies.tolist(),
+             "densities": {"1": np.sin(energies).tolist(), "-1": np.cos(energies).tolist()}}
+    data = {"tdos": dict(block, efermi=0.0), "tdos_per_site": {"0": block, "9": block}}
+    with open(os.path.join(FOLDER, f"{name}_persite.json"), "w") as f:
+        json.dump(data, f)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(FOLDER)
+    for i in range(4):
+        write_material(f"mat{i}", shift=0.1 * i)
+    return tmp_path
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Counter of json.load calls per corpus file."""
+    counts = Counter()
+    load = json.load
+
+    def counting_load(fp, *args, **kwargs):
+        name = getattr(fp, "name", "")
+        if os.path.dirname(os.path.abspath(name)) == os.path.abspath(FOLDER):
+            counts[os.path.basename(name)] += 1
+        return load(fp, *args, **kwargs)
+
+    monkeypatch.setattr(json, "load", counting_load)
+    return counts
+
+
+SPEC = {"datasets": [
+    {"out_file": "datasets/output/tdos.csv", "folder": FOLDER, "channels": [["tdos", "both"]],
+     "window": ["tdos_min", "tdos_max"], "dE": 0.01},
+    {"out_file": "datasets/output/site0.csv", "folder": FOLDER, "channels": [[["0"], "1"]],
+     "window": ["sites_min", "sites_max"], "dE": "lowest_spacing", "mode": "nearest", "require_b2": True},
+]}
+
+
+def test_cold_build_parses_each_file_once(corpus, parses):
+    run_pipeline(SPEC, n_workers=1)
+    assert parses == {f"mat{i}_persite.json": 1 for i in range(4)}
+    materials, _, _ = load_dataset("datasets/output/tdos.csv")
+    assert sorted(materials) == [f"mat{i}" for i in range(4)]
+
+
+def test_update_parses_only_new_and_changed_files(corpus, parses):
+    run_pipeline(SPEC, n_workers=1)
+    parses.clear()
+
+    write_material("mat4", shift=0.5)
+    write_material("mat1", n_points=180)
+    run_pipeline(SPEC, n_workers=1)
+    assert parses == {"mat4_persite.json": 1, "mat1_persite.json": 1}
+
+    parses.clear()
+    run_pipeline(SPEC, n_workers=1)
+    assert parses == {}
+
+
+def test_store_and_json_builds_match(corpus):
+    run_pipeline(SPEC, n_workers=1, use_cache=False)
+    from_store = [load_dataset(d["out_file"])[:2] + (load_energy_axis(d["out_file"]),) for d in SPEC["datasets"]]
+    run_pipeline(SPEC, n_workers=1, use_cache=False, incremental=False, use_store=False)
+    for (materials, X, centers), dataset in zip(from_store, SPEC["datasets"]):
+        json_materials, json_X, _ = load_dataset(dataset["out_file"])
+        assert list(materials) == list(json_materials)
+        assert np.array_equal(centers, load_energy_axis(dataset["out_file"]))
+        assert (X != json_X).nnz == 0
@@ -1,30 +1,19 @@
-import json
-import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
+import sys
 from pathlib import Path
 
-folder = os.path.join("datasets", "LSODOS")
-
-file_list = [f for f in os.listdir(folder) if f.endswith(".json")]
-
-spacings = []
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from lsodos.metadata import mean_spacings, update_index
 
-for file in file_list:
-    fpath = os.path.join(folder, file)
-    with open(fpath, "r") as f:
-        data = json.load(f)
-
-    energies = np.array(data["tdos"]["energies"], dtype=float)
-    diffs = np.diff(energies)
+folder = os.path.join("datasets", "LSODOS")
 
-    avg_spacing = np.mean(diffs)
-    spacings.append((Path(file).stem, avg_spacing))
+index = update_index(folder)
+df = mean_spacings(index)
 
-    print(f"{file}: average ΔE = {avg_spacing:.5f} eV")
+for material, avg_spacing in zip(df["material"], df["avg_spacing"]):
+    print(f"{material}.json: average ΔE = {avg_spacing:.5f} eV")
 
-df = pd.DataFrame(spacings, columns=["material", "avg_spacing"])
 print("\nSummary statistics:")
 print(df["avg_spacing"].describe())
 
@@ -32,4 +21,4 @@ output_dir = os.path.join("datasets", "output")
 os.makedirs(output_dir, exist_ok=True)
 out_file = os.path.join(output_dir, "average_spacings.csv")
 df.to_csv(out_file, index=False)
-print(f"\nSaved average spacings to: {out_file}")
\ No newline at end of file
+print(f"\nSaved average spacings to: {out_file}")
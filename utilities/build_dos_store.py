@@ -0,0 +1,21 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from lsodos.store import build_store
+
+# float64 reproduces the JSON values exactly; float32 halves the store size
+DTYPE = "float64"
+
+FOLDERS = [
+    os.path.join("datasets", "LSODOS"),
+    os.path.join("datasets", "lsodos_persitejsons_250930"),
+]
+
+for folder in FOLDERS:
+    if not os.path.isdir(folder):
+        print(f"Skipping {folder} (not found)")
+        continue
+    build_store(folder, dtype=DTYPE, verbose=False)
+    print(f"Built binary store for {folder}")
@@ -1,24 +1,16 @@
 import os
-import json
+import sys
+from pathlib import Path
 
-base = os.path.join("datasets", "lsodos_persitejsons_250930")
-missing_b2 = []
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from lsodos.metadata import files_missing_b2, update_index
 
-files = [f for f in os.listdir(base) if f.endswith(".json")]
-files = files[:]  # only first 100 files
+base = os.path.join("datasets", "lsodos_persitejsons_250930")
 
-for fname in files:
-    path = os.path.join(base, fname)
-    try:
-        with open(path) as f:
-            data = json.load(f)
-        tdos = data.get("tdos_per_site", {})
-        if "9" not in tdos:
-            missing_b2.append(fname)
-    except Exception as e:
-        print(f"Error reading {path}: {e}")
+index = update_index(base)
+missing_b2 = files_missing_b2(index)
 
 print("Files with no B2 (no key '9'):")
 for f in missing_b2:
     print(f)
-print(f"Total files with missing B2: {len(missing_b2)} out of {len(files)}")
\ No newline at end of file
+print(f"Total files with missing B2: {len(missing_b2)} out of {len(index['files'])}")
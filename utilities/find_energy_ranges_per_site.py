@@ -1,28 +1,19 @@
-import json
-import numpy as np
 import os
+import sys
+from pathlib import Path
 
-folder = os.path.join("datasets", "lsodos_persitejsons_250930")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from lsodos.metadata import files_missing_b2, site_energy_ranges, update_index
 
-emin = {str(i): float("inf") for i in range(10)}
-emax = {str(i): -float("inf") for i in range(10)}
+folder = os.path.join("datasets", "lsodos_persitejsons_250930")
 
-file_list = [f for f in os.listdir(folder) if f.endswith(".json")]
-for fname in file_list:
-    fpath = os.path.join(folder, fname)
-    with open(fpath, "r") as f:
-        data = json.load(f)
-    if "tdos_per_site" not in data or "9" not in data["tdos_per_site"]:
-        print(f"Skipping {fname} (no key 9)")
-        continue
-    tdos = data["tdos_per_site"]
-    for k in emin.keys():
-        e = np.array(tdos[k]["energies"], dtype=float)
-        emin[k] = min(emin[k], e.min())
-        emax[k] = max(emax[k], e.max())
+index = update_index(folder)
+for fname in files_missing_b2(index):
+    print(f"Skipping {fname} (no key 9)")
 
-for k in emin.keys():
-    if emin[k] != float("inf"):
-        print(f"site {k}: min {emin[k]:.6f} eV , max {emax[k]:.6f} eV")
+ranges = site_energy_ranges(index)
+for k in [str(i) for i in range(10)]:
+    if k in ranges:
+        print(f"site {k}: min {ranges[k][0]:.6f} eV , max {ranges[k][1]:.6f} eV")
     else:
         print(f"site {k}: no data")